@@ -12,7 +12,7 @@ class UserAdmin(BaseUserAdmin):
     
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Additional Info', {
-            'fields': ('full_name', 'profile_image', 'is_moderator')
+            'fields': ('full_name', 'profile_image', 'is_moderator', 'notification_frequency')
         }),
     )
     
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="notification_frequency",
+            field=models.CharField(
+                choices=[
+                    ("immediate", "Immediately"),
+                    ("hourly", "Hourly digest"),
+                    ("daily", "Daily digest"),
+                ],
+                default="immediate",
+                max_length=10,
+                verbose_name="email notifications",
+            ),
+        ),
+    ]
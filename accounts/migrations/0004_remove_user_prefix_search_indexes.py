@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:36
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_user_search_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="user",
+            name="accounts_user_uname_lower_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="user",
+            name="accounts_user_email_lower_idx",
+        ),
+    ]
@@ -1,15 +1,28 @@
 from django.contrib.auth.models import AbstractUser, Group
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 
 class User(AbstractUser):
     """Custom User model for StudyDeck Forum"""
     
+    class NotificationFrequency(models.TextChoices):
+        IMMEDIATE = 'immediate', _('Immediately')
+        HOURLY = 'hourly', _('Hourly digest')
+        DAILY = 'daily', _('Daily digest')
+    
     email = models.EmailField(_("email address"), unique=True)
     full_name = models.CharField(max_length=255, blank=True)
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
     is_moderator = models.BooleanField(default=False)
+    notification_frequency = models.CharField(
+        _("email notifications"),
+        max_length=10,
+        choices=NotificationFrequency.choices,
+        default=NotificationFrequency.IMMEDIATE
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -20,6 +33,13 @@ class Meta:
         verbose_name = _("User")
         verbose_name_plural = _("Users")
         ordering = ["-created_at"]
+        # Sort keys of forum.views.manage_users. PostgreSQL also gets trigram
+        # indexes for its substring search (0003).
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["last_login", "id"]),
+            models.Index(Lower("full_name"), F("id"), name="accounts_user_name_lower_idx"),
+        ]
     
     def __str__(self):
         return self.full_name or self.email
@@ -17,6 +17,7 @@ python manage.py collectstatic --no-input
 
 # Apply any outstanding database migrations
 python manage.py migrate --no-input
+python manage.py createcachetable
 
 # Create superuser if it doesn't exist (optional)
 python manage.py shell << END
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Category, Tag, Thread, Reply, ThreadLike, ReplyLike, Report
+from django.db.models import F
+from django.utils import timezone
+from .models import (
+    Category, Tag, Thread, Reply, ThreadLike, ReplyLike, Report, ModerationAction,
+    Notification, UserStats
+)
+from .signals import touch_thread_pages
 
 
 @admin.register(Category)
@@ -26,20 +32,28 @@ class ThreadAdmin(admin.ModelAdmin):
     
     actions = ['lock_threads', 'unlock_threads', 'pin_threads', 'unpin_threads']
     
+    def _update_threads(self, queryset, **fields):
+        # update() sends no post_save, so do what the signal handlers would:
+        # bump the version cached listing rows are keyed on and touch the
+        # page stamps of the threads and their listings
+        thread_ids = list(queryset.values_list('pk', flat=True))
+        queryset.update(version=F('version') + 1, **fields)
+        touch_thread_pages(thread_ids)
+    
     def lock_threads(self, request, queryset):
-        queryset.update(is_locked=True)
+        self._update_threads(queryset, is_locked=True)
     lock_threads.short_description = "Lock selected threads"
     
     def unlock_threads(self, request, queryset):
-        queryset.update(is_locked=False)
+        self._update_threads(queryset, is_locked=False)
     unlock_threads.short_description = "Unlock selected threads"
     
     def pin_threads(self, request, queryset):
-        queryset.update(is_pinned=True)
+        self._update_threads(queryset, is_pinned=True)
     pin_threads.short_description = "Pin selected threads"
     
     def unpin_threads(self, request, queryset):
-        queryset.update(is_pinned=False)
+        self._update_threads(queryset, is_pinned=False)
     unpin_threads.short_description = "Unpin selected threads"
 
 
@@ -83,11 +97,48 @@ def get_content_type(self, obj):
     actions = ['mark_resolved', 'mark_dismissed']
     
     def mark_resolved(self, request, queryset):
-        for report in queryset:
-            report.resolve(request.user, 'Resolved via admin action')
+        closed = Report.close(
+            queryset, Report.ReportStatus.RESOLVED, request.user, 'Resolved via admin action'
+        )
+        self.message_user(request, f"{closed} reports resolved.")
     mark_resolved.short_description = "Mark as resolved"
     
     def mark_dismissed(self, request, queryset):
-        for report in queryset:
-            report.dismiss(request.user, 'Dismissed via admin action')
-    mark_dismissed.short_description = "Dismiss reports"
\ No newline at end of file
+        closed = Report.close(
+            queryset, Report.ReportStatus.DISMISSED, request.user, 'Dismissed via admin action'
+        )
+        self.message_user(request, f"{closed} reports dismissed.")
+    mark_dismissed.short_description = "Dismiss reports"
+
+
+@admin.register(ModerationAction)
+class ModerationActionAdmin(admin.ModelAdmin):
+    list_display = ['status', 'moderator', 'notes', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['moderator__email', 'notes']
+    ordering = ['-created_at']
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'recipient', 'thread', 'status', 'attempts', 'next_attempt_at', 'created_at']
+    list_filter = ['kind', 'status', 'created_at']
+    search_fields = ['recipient__email', 'thread__title', 'last_error']
+    raw_id_fields = ['recipient', 'actor', 'thread', 'reply']
+    ordering = ['-created_at']
+    
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=Notification.Status.SENT).update(
+            status=Notification.Status.PENDING, next_attempt_at=timezone.now()
+        )
+    retry_now.short_description = "Retry selected notifications now"
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'thread_count', 'reply_count', 'likes_received', 'solution_count']
+    search_fields = ['user__email', 'user__username']
+    readonly_fields = ['user', 'thread_count', 'reply_count', 'likes_received', 'solution_count']
+    ordering = ['-reply_count']
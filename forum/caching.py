@@ -0,0 +1,413 @@
+"""
+Helpers on top of the shared cache (see CACHES in settings).
+
+``CacheNamespace`` groups keys under a version number, so a whole group can
+be invalidated at once by bumping the version instead of deleting keys one
+by one. ``SlidingWindowLimiter`` and the ``ratelimit`` decorator enforce
+request budgets across all workers. On Redis each check is a single atomic
+pipelined round trip; other backends increment with a read and a write,
+so concurrent hits can be undercounted there. ``ChangeStamps`` and the ``conditional_page``
+decorator let browsers and proxies revalidate pages without the view running.
+"""
+import functools
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import PermissionDenied
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+try:
+    from django.core.cache.backends.redis import RedisCache
+except ImportError:
+    RedisCache = None
+
+
+class CacheNamespace:
+    """A named, versioned group of cache keys that can be invalidated together"""
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT, alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.timeout = timeout
+        self.alias = alias
+        self._version_key = f'ns:{name}'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version(self):
+        """Current version of the namespace"""
+        version = self.cache.get(self._version_key)
+        if version is None:
+            # Start from the clock rather than 1: if the version key is ever
+            # evicted, the new version must not collide with an old one.
+            self.cache.add(self._version_key, int(time.time() * 1000), None)
+            version = self.cache.get(self._version_key)
+        return version
+
+    def invalidate(self):
+        """Make every key currently in the namespace unreachable"""
+        try:
+            return self.cache.incr(self._version_key)
+        except ValueError:
+            return self.version()
+
+    def _key(self, key):
+        return f'{self.name}:{key}'
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        return self.cache.get(self._key(key), default, version=version or self.version())
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.cache.set(
+            self._key(key), value, self._timeout(timeout), version=version or self.version()
+        )
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.get_or_set(
+            self._key(key), default, self._timeout(timeout), version=version or self.version()
+        )
+
+    def get_many(self, keys, version=None):
+        """Return ``{key: value}`` for the keys that are cached"""
+        found = self.cache.get_many(
+            [self._key(key) for key in keys], version=version or self.version()
+        )
+        prefix = len(self.name) + 1
+        return {key[prefix:]: value for key, value in found.items()}
+
+    def set_many(self, mapping, timeout=DEFAULT_TIMEOUT, version=None):
+        self.cache.set_many(
+            {self._key(key): value for key, value in mapping.items()},
+            self._timeout(timeout),
+            version=version or self.version()
+        )
+
+    def delete(self, key, version=None):
+        self.cache.delete(self._key(key), version=version or self.version())
+
+    def add_member(self, key, member, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Add the string ``member`` to the set at ``key``, restarting its
+        timeout. One atomic SADD on Redis; elsewhere a read and a write, so a
+        concurrent add can be lost until the member is added again.
+        """
+        cache = self.cache
+        version = version or self.version()
+        timeout = self._timeout(timeout)
+        if RedisCache is not None and isinstance(cache, RedisCache):
+            key = cache.make_and_validate_key(self._key(key), version=version)
+            pipe = cache._cache.get_client(key, write=True).pipeline(transaction=False)
+            pipe.sadd(key, member)
+            timeout = cache.get_backend_timeout(timeout)
+            if timeout is not None:
+                pipe.expire(key, max(int(timeout), 1))
+            pipe.execute()
+            return
+        members = cache.get(self._key(key), version=version) or set()
+        cache.set(self._key(key), members | {member}, timeout, version=version)
+
+    def members(self, key, version=None):
+        """The set of strings ``add_member()`` added at ``key``"""
+        cache = self.cache
+        version = version or self.version()
+        if RedisCache is not None and isinstance(cache, RedisCache):
+            key = cache.make_and_validate_key(self._key(key), version=version)
+            client = cache._cache.get_client(key)
+            return {member.decode() for member in client.smembers(key)}
+        return cache.get(self._key(key), version=version) or set()
+
+
+class FragmentCache(CacheNamespace):
+    """
+    Cache of rendered HTML fragments with hit/miss counters shared by all
+    workers, so the hit rate can be checked with ``manage.py cache_stats``
+    """
+
+    def _stat_key(self, stat):
+        return f'stats:{self.name}:{stat}'
+
+    def render_many(self, objects, key, render):
+        """
+        Return the fragments for ``objects`` in order. ``key(obj)`` must change
+        whenever the object's fragment would; ``render(misses)`` is called
+        once with the objects not in the cache and returns their fragments.
+        """
+        version = self.version()
+        keys = [key(obj) for obj in objects]
+        fragments = self.get_many(keys, version=version)
+        misses = [(k, obj) for k, obj in zip(keys, objects) if k not in fragments]
+
+        if misses:
+            rendered = dict(zip(
+                [k for k, _ in misses],
+                render([obj for _, obj in misses])
+            ))
+            self.set_many(rendered, version=version)
+            fragments.update(rendered)
+
+        self.record(hits=len(objects) - len(misses), misses=len(misses))
+        return [fragments[k] for k in keys]
+
+    def record(self, hits=0, misses=0):
+        for stat, n in (('hits', hits), ('misses', misses)):
+            if not n:
+                continue
+            stat_key = self._stat_key(stat)
+            if not self.cache.add(stat_key, n, None):
+                try:
+                    self.cache.incr(stat_key, n)
+                except ValueError:
+                    self.cache.set(stat_key, n, None)
+
+    def stats(self):
+        """Return ``{'hits', 'misses', 'hit_rate'}`` since the last reset"""
+        values = self.cache.get_many([self._stat_key('hits'), self._stat_key('misses')])
+        hits = values.get(self._stat_key('hits'), 0)
+        misses = values.get(self._stat_key('misses'), 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else None,
+        }
+
+    def reset_stats(self):
+        self.cache.delete_many([self._stat_key('hits'), self._stat_key('misses')])
+
+
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """Parse ``'5/h'`` or ``'100/15m'`` into ``(limit, window seconds)``"""
+    match = re.fullmatch(r'(\d+)/(\d*)([smhd])', rate)
+    if not match:
+        raise ValueError(f'Invalid rate: {rate!r}')
+    limit, count, unit = match.groups()
+    return int(limit), int(count or 1) * RATE_UNITS[unit]
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window rate limiter.
+
+    Hits are counted in fixed windows. The count for the last ``window``
+    seconds is estimated as the current window's count plus the previous
+    window's count, weighted by how much of it still overlaps. This avoids
+    the burst of up to twice the limit that plain fixed windows allow at
+    their boundaries.
+    """
+
+    def __init__(self, rate, alias=DEFAULT_CACHE_ALIAS):
+        self.limit, self.window = parse_rate(rate)
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _counts(self, current_key, previous_key):
+        """Increment the current window and return (current, previous) counts"""
+        cache = self.cache
+        timeout = self.window * 2
+
+        if RedisCache is not None and isinstance(cache, RedisCache):
+            current_key = cache.make_and_validate_key(current_key)
+            previous_key = cache.make_and_validate_key(previous_key)
+            pipe = cache._cache.get_client(current_key, write=True).pipeline(transaction=False)
+            pipe.incr(current_key)
+            pipe.expire(current_key, timeout)
+            pipe.get(previous_key)
+            current, _, previous = pipe.execute()
+            return current, int(previous or 0)
+
+        if cache.add(current_key, 1, timeout):
+            current = 1
+        else:
+            try:
+                current = cache.incr(current_key)
+            except ValueError:
+                cache.set(current_key, 1, timeout)
+                current = 1
+        return current, cache.get(previous_key, 0)
+
+    def hit(self, key):
+        """Record a hit for ``key``; returns False if it is over the limit"""
+        now = time.time()
+        window = int(now // self.window)
+        current, previous = self._counts(
+            f'rl:{key}:{self.window}:{window}',
+            f'rl:{key}:{self.window}:{window - 1}',
+        )
+        overlap = 1 - (now % self.window) / self.window
+        return current + previous * overlap <= self.limit
+
+
+def _client_key(request, key):
+    if key == 'ip':
+        return request.META.get('REMOTE_ADDR', '')
+    if key == 'user':
+        if request.user.is_authenticated:
+            return f'u{request.user.pk}'
+        return request.META.get('REMOTE_ADDR', '')
+    if callable(key):
+        return key(request)
+    raise ValueError(f'Unknown rate limit key: {key!r}')
+
+
+def ratelimit(key='user', rate='10/m', method='POST', block=True):
+    """
+    Limit a view to ``rate`` requests per ``key`` ('user', 'ip' or a callable
+    taking the request), counting only requests made with ``method``.
+    Over the limit, raises PermissionDenied or, with ``block=False``, sets
+    ``request.limited``.
+    """
+    limiter = SlidingWindowLimiter(rate)
+    methods = {method} if isinstance(method, str) else set(method or ())
+
+    def decorator(view):
+        group = f'{view.__module__}.{view.__qualname__}'
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.limited = getattr(request, 'limited', False)
+            if not methods or request.method in methods:
+                if not limiter.hit(f'{group}:{_client_key(request, key)}'):
+                    request.limited = True
+                    if block:
+                        raise PermissionDenied('Rate limit exceeded')
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class ChangeStamps:
+    """
+    Times (in milliseconds) at which groups of pages last changed, shared by
+    all workers. Writes ``touch()`` the keys they affect. A stamp missing
+    from the cache, never set or evicted, starts at the current time, so a
+    page may be re-sent needlessly but is never reported unchanged after a
+    write.
+    """
+
+    def __init__(self, name, alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, key):
+        return f'stamp:{self.name}:{key}'
+
+    def get_many(self, keys):
+        """Return the stamps for ``keys``, in order"""
+        cache_keys = [self._key(key) for key in keys]
+        stamps = self.cache.get_many(cache_keys)
+        missing = [key for key in cache_keys if key not in stamps]
+        if missing:
+            now = int(time.time() * 1000)
+            for key in missing:
+                self.cache.add(key, now, None)
+            stamps.update(self.cache.get_many(missing))
+            return [stamps.get(key, now) for key in cache_keys]
+        return [stamps[key] for key in cache_keys]
+
+    def touch(self, *keys):
+        """Move the stamps for ``keys`` to now"""
+        now = int(time.time() * 1000)
+        cache_keys = [self._key(key) for key in keys]
+        stamps = self.cache.get_many(cache_keys)
+        for key in cache_keys:
+            # Always move forwards, even if another worker's clock is ahead
+            try:
+                self.cache.incr(key, max(now - stamps[key], 1))
+            except (KeyError, ValueError):
+                self.cache.add(key, now, None)
+
+
+def _viewer(request):
+    """
+    What a page depends on besides the stamps: the user and, since the page
+    embeds a token derived from it, the CSRF cookie
+    """
+    user = f'u{request.user.pk}' if request.user.is_authenticated else 'anon'
+    return f"{user}:{request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')}"
+
+
+def conditional_page(stamps, keys, not_modified=None):
+    """
+    Answer conditional GETs with 304 Not Modified while none of the stamps
+    for ``keys(*args, **kwargs)`` have moved and the viewer is the same.
+    ``not_modified(request, *args, **kwargs)``, if given, runs on a 304 in
+    place of the view. Pages with pending flash messages are always sent.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            values = stamps.get_many(keys(*args, **kwargs))
+            digest = hashlib.blake2b(
+                ':'.join([*map(str, values), _viewer(request)]).encode('utf-8'),
+                digest_size=12
+            ).hexdigest()
+            # Weak: the markup differs between renders (masked CSRF tokens)
+            etag = f'W/"{digest}"'
+            last_modified = max(values) // 1000
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.headers.setdefault('ETag', etag)
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+            elif response.status_code == 304 and not_modified is not None:
+                not_modified(request, *args, **kwargs)
+
+            # Let caches store the page but always revalidate it first
+            patch_cache_control(
+                response, no_cache=True, private=request.user.is_authenticated
+            )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Shared data on the forum home page (categories, recent and popular
+# threads); invalidated by forum.signals on any thread, reply or like write
+home_page_cache = CacheNamespace('forum-home', timeout=5 * 60)
+
+# Rendered rows of thread listings, keyed on Thread.version
+thread_row_cache = FragmentCache('thread-rows', timeout=24 * 60 * 60)
+
+FRAGMENT_CACHES = [thread_row_cache]
+
+# Last changes to thread pages and listings, touched by forum.signals
+page_stamps = ChangeStamps('pages')
+
+# Row counts of filtered listings (see forum.pagination.cached_count), per
+# filter combination; invalidated by forum.signals on thread and user writes
+COUNT_TIMEOUT = getattr(settings, 'FORUM_COUNT_CACHE_TIMEOUT', 60)
+thread_counts = CacheNamespace('thread-counts', timeout=COUNT_TIMEOUT)
+user_counts = CacheNamespace('user-counts', timeout=COUNT_TIMEOUT)
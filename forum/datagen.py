@@ -0,0 +1,343 @@
+"""
+Synthetic forum data for load testing and benchmarks.
+
+``ForumDataGenerator`` inserts users, threads, replies, likes, tags, course
+links and reports with ``bulk_create`` in batches, one transaction per
+batch. Replies and likes per thread follow a power-law (Lomax) distribution,
+so most threads are small and a few are very large, as on a real forum.
+Everything is drawn from one seeded random generator and timestamps are
+offsets from one reference time: the same seed and ``now`` against the same
+starting database produce the same data.
+
+Rows are inserted directly, so model signals don't run. The denormalized
+counters are computed while generating, and the latest-reply columns and
+user stats are filled in once the replies exist. Search indexes are kept in
+sync by their database triggers. The caches keyed on forum content are
+invalidated at the end.
+"""
+import contextlib
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import home_page_cache, page_stamps, thread_counts, user_counts
+from .management.commands.recount_forum import (
+    create_missing_user_stats, thread_counter_updates, user_stats_updates
+)
+from .models import Category, Tag, Thread, Reply, ThreadLike, ReplyLike, Report, UserStats
+from .ranking import hot_score
+from .rendering import render_markdown, RENDERER_VERSION
+from courses.models import Course, Department
+
+User = get_user_model()
+
+WORDS = (
+    'exam midsem compre quiz lab assignment lecture tutorial notes slides '
+    'professor deadline grading project report syllabus course elective '
+    'thermodynamics algorithms circuits economics chemistry database '
+    'compiler network semester library hostel registration practice '
+    'question answer doubt solution reference textbook chapter problem'
+).split()
+
+CONTENT_POOL_SIZE = 200
+
+
+def power_law(rng, mean, alpha, cap):
+    """
+    Draw a non-negative integer from a Lomax (Pareto II) distribution with
+    roughly the given mean, capped at ``cap``. Lower ``alpha`` means a
+    heavier tail.
+    """
+    if mean <= 0 or cap <= 0:
+        return 0
+    scale = mean * (alpha - 1)
+    return min(int(scale * (rng.paretovariate(alpha) - 1)), cap)
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create() keep the auto_now / auto_now_add values it is given"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ForumDataGenerator:
+    """Generate forum content in bulk; see the module docstring"""
+
+    def __init__(self, users=1000, categories=5, threads_per_category=200,
+                 replies_per_thread=20.0, reply_alpha=1.5, max_replies=10_000,
+                 thread_likes=3.0, reply_likes=0.5, tags=30, courses=20,
+                 reports=100, days=365, seed=0, now=None, batch_size=2000, log=None):
+        if users < 1:
+            raise ValueError('users must be at least 1')
+        if reply_alpha <= 1:
+            raise ValueError('reply_alpha must be greater than 1')
+        self.users = users
+        self.categories = categories
+        self.threads_per_category = threads_per_category
+        self.replies_per_thread = replies_per_thread
+        self.reply_alpha = reply_alpha
+        self.max_replies = max_replies
+        self.thread_likes = thread_likes
+        self.reply_likes = reply_likes
+        self.tags = tags
+        self.courses = courses
+        self.reports = reports
+        self.days = days
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.now = now or timezone.now()
+        self.counts = dict.fromkeys(
+            ['threads', 'replies', 'thread_likes', 'reply_likes', 'reports'], 0
+        )
+
+    # Supporting rows, reused when they already exist
+
+    def ensure_users(self):
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(
+                username=f'gen_user_{i}',
+                email=f'gen_user_{i}@pilani.bits-pilani.ac.in',
+                full_name=f'Generated User {i}',
+                password=password,
+            )
+            for i in range(self.users)
+        ], batch_size=self.batch_size, ignore_conflicts=True)
+        return list(
+            User.objects.filter(username__startswith='gen_user_')
+            .order_by('pk').values_list('pk', flat=True)[:self.users]
+        )
+
+    def ensure_categories(self):
+        for i in range(Category.objects.count(), self.categories):
+            Category.objects.get_or_create(
+                name=f'Generated Category {i}', defaults={'order': 100 + i}
+            )
+        return list(Category.objects.order_by('pk'))
+
+    def ensure_tags(self):
+        names = [
+            WORDS[i % len(WORDS)] + (f'-{i // len(WORDS)}' if i >= len(WORDS) else '')
+            for i in range(self.tags)
+        ]
+        for name in names:
+            Tag.objects.get_or_create(name=name)
+        return list(Tag.objects.filter(name__in=names).order_by('pk').values_list('pk', flat=True))
+
+    def ensure_courses(self):
+        if not self.courses:
+            return []
+        department, _ = Department.objects.get_or_create(
+            code='GEN', defaults={'name': 'Generated Department'}
+        )
+        codes = [f'GEN F{i:03d}' for i in range(self.courses)]
+        for code in codes:
+            Course.objects.get_or_create(
+                code=code, defaults={'title': f'Generated course {code}', 'department': department}
+            )
+        return list(Course.objects.filter(code__in=codes).order_by('pk').values_list('pk', flat=True))
+
+    def content_pool(self):
+        """Pre-rendered bodies shared between rows, so markdown runs once per body"""
+        pool = []
+        for _ in range(CONTENT_POOL_SIZE):
+            text = '\n\n'.join(
+                ' '.join(self.rng.choices(WORDS, k=self.rng.randint(10, 40))).capitalize() + '.'
+                for _ in range(self.rng.randint(1, 4))
+            )
+            pool.append({
+                'content': text,
+                'content_html': render_markdown(text),
+                'content_html_version': RENDERER_VERSION,
+            })
+        return pool
+
+    # Content
+
+    def run(self):
+        """Generate everything; returns the number of rows created per kind"""
+        rng = self.rng
+        user_ids = self.ensure_users()
+        categories = self.ensure_categories()
+        tag_ids = self.ensure_tags()
+        course_ids = self.ensure_courses()
+        self.pool = self.content_pool()
+        self.user_ids = user_ids
+        self.reply_ids = []
+        thread_ids = []
+
+        plan = [
+            category.pk
+            for category in categories
+            for _ in range(self.threads_per_category)
+        ]
+        rng.shuffle(plan)
+
+        with explicit_timestamps(Thread, Reply, ThreadLike, ReplyLike, Report):
+            for category_ids in _chunks(plan, self.batch_size):
+                threads = self.create_threads(category_ids, tag_ids, course_ids)
+                thread_ids += [thread.pk for thread in threads]
+                self.create_replies(threads)
+                self.log(
+                    f"{self.counts['threads']} threads, {self.counts['replies']} replies"
+                )
+            self.create_reports(thread_ids)
+
+        self.set_latest_replies(thread_ids)
+        self.refresh_user_stats(user_ids)
+        home_page_cache.invalidate()
+        thread_counts.invalidate()
+        user_counts.invalidate()
+        page_stamps.touch(
+            'threads', 'taxonomy', *(f'category:{category.slug}' for category in categories)
+        )
+        return self.counts
+
+    def create_threads(self, category_ids, tag_ids, course_ids):
+        rng = self.rng
+        threads = []
+        for category_id in category_ids:
+            created = self.now - timedelta(seconds=rng.uniform(0, self.days * 86400))
+            reply_count = power_law(
+                rng, self.replies_per_thread, self.reply_alpha, self.max_replies
+            )
+            likes = power_law(rng, self.thread_likes, self.reply_alpha, len(self.user_ids))
+            views = reply_count * rng.randint(2, 20)
+            thread = Thread(
+                title=' '.join(rng.choices(WORDS, k=rng.randint(4, 9))).capitalize(),
+                author_id=rng.choice(self.user_ids),
+                category_id=category_id,
+                views=views,
+                created_at=created,
+                updated_at=created,
+                last_activity=created,
+                reply_count=reply_count,
+                like_count=likes,
+                hot_score=hot_score(likes, reply_count, views, created),
+                **rng.choice(self.pool),
+            )
+            # Reply times, oldest first; the thread is active as of the last one
+            thread.reply_times = sorted(
+                created + (self.now - created) * rng.random() for _ in range(reply_count)
+            )
+            if reply_count:
+                thread.last_activity = thread.reply_times[-1]
+            threads.append(thread)
+
+        with transaction.atomic():
+            Thread.objects.bulk_create(threads, batch_size=self.batch_size)
+            Thread.tags.through.objects.bulk_create([
+                Thread.tags.through(thread_id=thread.pk, tag_id=tag_id)
+                for thread in threads
+                for tag_id in rng.sample(tag_ids, min(len(tag_ids), rng.randint(0, 3)))
+            ], batch_size=self.batch_size)
+            Thread.courses.through.objects.bulk_create([
+                Thread.courses.through(thread_id=thread.pk, course_id=course_id)
+                for thread in threads
+                for course_id in rng.sample(course_ids, min(len(course_ids), rng.randint(0, 2)))
+            ], batch_size=self.batch_size)
+            ThreadLike.objects.bulk_create([
+                ThreadLike(user_id=user_id, thread_id=thread.pk, created_at=thread.last_activity)
+                for thread in threads
+                for user_id in rng.sample(self.user_ids, thread.like_count)
+            ], batch_size=self.batch_size)
+
+        self.counts['threads'] += len(threads)
+        self.counts['thread_likes'] += sum(thread.like_count for thread in threads)
+        return threads
+
+    def _replies(self, threads):
+        rng = self.rng
+        for thread in threads:
+            for created in thread.reply_times:
+                yield Reply(
+                    thread_id=thread.pk,
+                    author_id=rng.choice(self.user_ids),
+                    created_at=created,
+                    updated_at=created,
+                    like_count=power_law(
+                        rng, self.reply_likes, self.reply_alpha, len(self.user_ids)
+                    ),
+                    **rng.choice(self.pool),
+                )
+
+    def create_replies(self, threads):
+        rng = self.rng
+        for replies in _chunks(self._replies(threads), self.batch_size):
+            with transaction.atomic():
+                Reply.objects.bulk_create(replies)
+                ReplyLike.objects.bulk_create([
+                    ReplyLike(user_id=user_id, reply_id=reply.pk, created_at=reply.created_at)
+                    for reply in replies
+                    for user_id in rng.sample(self.user_ids, reply.like_count)
+                ], batch_size=self.batch_size)
+            self.reply_ids += [reply.pk for reply in replies]
+            self.counts['replies'] += len(replies)
+            self.counts['reply_likes'] += sum(reply.like_count for reply in replies)
+
+    def create_reports(self, thread_ids):
+        rng = self.rng
+        if not thread_ids:
+            return
+        reports = []
+        for _ in range(self.reports):
+            on_reply = bool(self.reply_ids) and rng.random() < 0.7
+            created = self.now - timedelta(seconds=rng.uniform(0, 30 * 86400))
+            status = rng.choices(Report.ReportStatus.values, weights=[6, 1, 2, 1])[0]
+            reports.append(Report(
+                thread_id=None if on_reply else rng.choice(thread_ids),
+                reply_id=rng.choice(self.reply_ids) if on_reply else None,
+                reporter_id=rng.choice(self.user_ids),
+                reason=rng.choice(Report.ReportReason.values),
+                description=' '.join(rng.choices(WORDS, k=rng.randint(5, 20))).capitalize(),
+                status=status,
+                created_at=created,
+                resolved_at=None if status == Report.ReportStatus.PENDING else created,
+            ))
+        for chunk in _chunks(reports, self.batch_size):
+            with transaction.atomic():
+                Report.objects.bulk_create(chunk)
+        self.counts['reports'] += len(reports)
+
+    def set_latest_replies(self, thread_ids):
+        """Fill in last_reply / last_reply_author now that the replies have ids"""
+        updates = thread_counter_updates()
+        updates = {field: updates[field] for field in ('last_reply', 'last_reply_author')}
+        for chunk in _chunks(thread_ids, self.batch_size):
+            with transaction.atomic():
+                Thread.objects.filter(pk__in=chunk, reply_count__gt=0).update(**updates)
+
+    def refresh_user_stats(self, user_ids):
+        """Recount the activity stats of the users content was generated for"""
+        create_missing_user_stats(user_ids, self.batch_size)
+        updates = user_stats_updates()
+        for chunk in _chunks(user_ids, self.batch_size):
+            with transaction.atomic():
+                UserStats.objects.filter(user_id__in=chunk).update(**updates)
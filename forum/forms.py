@@ -1,5 +1,6 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.contrib.auth import get_user_model
 from markdownx.fields import MarkdownxFormField
 from .models import Thread, Reply, Report, Category, Tag
 from courses.models import Course
@@ -116,6 +117,21 @@ def clean_description(self):
         return description
 
 
+class NotificationSettingsForm(forms.ModelForm):
+    """Form for choosing how email notifications are delivered"""
+    
+    class Meta:
+        model = get_user_model()
+        fields = ['notification_frequency']
+        widgets = {
+            'notification_frequency': forms.RadioSelect,
+        }
+        help_texts = {
+            'notification_frequency': 'Digests collect replies, mentions and moderation '
+                                      'notices into one email per hour or per day.',
+        }
+
+
 class SearchForm(forms.Form):
     """Form for searching forum content"""
     
@@ -0,0 +1,271 @@
+import json
+import math
+import subprocess
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from forum.datagen import ForumDataGenerator
+from forum.models import Category, Tag, Thread, Reply
+from forum.pagination import KeysetPaginator
+from forum.views import (
+    CATEGORY_THREAD_ORDERINGS, CATEGORY_THREADS_PER_PAGE, REPLIES_PER_PAGE,
+    THREAD_LIST_ORDERINGS, THREADS_PER_PAGE,
+)
+
+User = get_user_model()
+
+BENCH_USERS = 500
+
+
+def _percentile(values, p):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    rank = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[rank]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the main forum views against a dataset of a given size and '
+        'print latency percentiles, query counts and peak memory as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=10_000,
+            help='Number of threads the dataset should have (default: 10000)'
+        )
+        parser.add_argument(
+            '--replies',
+            type=int,
+            default=1_000_000,
+            help='Number of replies the dataset should have (default: 1000000)'
+        )
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Generate data (see generate_forum_data) until the dataset reaches '
+                 'about the requested size. Without it, the existing data is benchmarked as is.'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed requests per scenario (default: 20)'
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Clear the cache before every request'
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            metavar='VIEW',
+            help='Only run scenarios for these views (e.g. thread_detail search)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the JSON report to this file instead of stdout'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        if options['seed']:
+            self.seed(options['threads'], options['replies'])
+
+        if not Thread.objects.filter(is_deleted=False).exists():
+            raise CommandError('There are no threads to benchmark; run with --seed')
+
+        user = self.bench_user()
+        client = Client()
+        client.force_login(user)
+
+        results = []
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for view, name, url in self.scenarios():
+                if options['only'] and view not in options['only']:
+                    continue
+                self.stderr.write(f'{name}: {url}')
+                results.append(self.run(client, view, name, url, options))
+
+        report = {
+            'commit': self.commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'threads': Thread.objects.count(),
+            'replies': Reply.objects.count(),
+            'iterations': options['iterations'],
+            'cold_cache': options['cold'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def bench_user(self):
+        user = User.objects.filter(username='gen_user_0').first()
+        user = user or User.objects.filter(is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('Search needs a logged-in user; run with --seed')
+        return user
+
+    # Seeding
+
+    def seed(self, threads, replies):
+        """Generate threads and replies until there are about as many as requested"""
+        missing_threads = max(threads - Thread.objects.count(), 0)
+        missing_replies = max(replies - Reply.objects.count(), 0)
+        if not missing_threads:
+            if missing_replies:
+                self.stderr.write('Replies are only generated with new threads; raise --threads')
+            return
+
+        categories = max(Category.objects.count(), 1)
+        per_category = math.ceil(missing_threads / categories)
+        self.stderr.write(
+            f'Generating {per_category * categories} threads and about {missing_replies} replies'
+        )
+        ForumDataGenerator(
+            users=BENCH_USERS,
+            categories=categories,
+            threads_per_category=per_category,
+            replies_per_thread=missing_replies / (per_category * categories),
+            log=self.stderr.write,
+        ).run()
+
+    # Benchmarking
+
+    def scenarios(self):
+        """Yield ``(view, scenario name, url)`` covering typical and worst-case requests"""
+        threads = Thread.objects.filter(is_deleted=False)
+        thread_count = threads.count()
+        all_threads = reverse('forum:all_threads')
+
+        def deep_page(queryset, ordering, per_page, fraction):
+            """Cursor of the listing page ``fraction`` of the way through"""
+            count = queryset.count()
+            offset = min(int(count * fraction) // per_page * per_page, count - 1)
+            if offset < per_page:
+                return None
+            obj = queryset.order_by(*ordering)[offset - 1]
+            return KeysetPaginator(queryset, ordering, per_page).cursor_for(obj)
+
+        latest = THREAD_LIST_ORDERINGS['latest']
+        yield 'forum_home', 'home', reverse('forum:home')
+        yield 'all_threads', 'all_threads latest', all_threads
+        yield 'all_threads', 'all_threads popular', f'{all_threads}?sort=popular'
+        yield 'all_threads', 'all_threads hot', f'{all_threads}?sort=hot'
+        yield 'trending_threads', 'trending', reverse('forum:trending_threads')
+        yield 'all_threads', 'all_threads unanswered', f'{all_threads}?sort=unanswered'
+        for name, fraction in (('middle', 0.5), ('last', 1)):
+            cursor = deep_page(threads, latest, THREADS_PER_PAGE, fraction)
+            if cursor:
+                yield 'all_threads', f'all_threads {name} page', f'{all_threads}?after={cursor}'
+
+        tag = Tag.objects.annotate(n=Count('threads')).order_by('-n').first()
+        if tag:
+            yield 'all_threads', 'all_threads tag filter', f'{all_threads}?tag={tag.slug}'
+
+        category = Category.objects.annotate(n=Count('threads')).order_by('-n').first()
+        if category:
+            url = reverse('forum:category_detail', args=[category.slug])
+            yield 'category_detail', 'category_detail latest', url
+            yield 'category_detail', 'category_detail popular', f'{url}?sort=popular'
+            cursor = deep_page(
+                threads.filter(category=category), CATEGORY_THREAD_ORDERINGS['latest'],
+                CATEGORY_THREADS_PER_PAGE, 1
+            )
+            if cursor:
+                yield 'category_detail', 'category_detail last page', f'{url}?after={cursor}'
+            if tag:
+                yield 'category_detail', 'category_detail tag filter', f'{url}?tag={tag.slug}'
+
+        big = threads.order_by('-reply_count').first()
+        typical = threads.order_by('reply_count')[thread_count // 2]
+        url = reverse('forum:thread_detail', args=[typical.pk])
+        yield 'thread_detail', f'thread_detail typical ({typical.reply_count} replies)', url
+        url = reverse('forum:thread_detail', args=[big.pk])
+        yield 'thread_detail', f'thread_detail largest ({big.reply_count} replies)', url
+
+        replies = Reply.objects.filter(thread=big, is_deleted=False, is_solution=False)
+        middle = replies.order_by('created_at', 'id')[big.reply_count // 2:].first()
+        if middle:
+            paginator = KeysetPaginator(replies, ['created_at', 'id'], REPLIES_PER_PAGE)
+            cursor = paginator.cursor_for_page_containing(middle)
+            if cursor:
+                yield 'thread_detail', 'thread_detail largest, middle page', f'{url}?after={cursor}'
+
+        search = reverse('forum:search')
+        word = typical.title.split()[0].lower()
+        yield 'search', 'search one term', f'{search}?q={word}'
+        yield 'search', 'search two terms', f"{search}?q={'+'.join(typical.title.split()[:2])}"
+        yield 'search', 'search typo', f'{search}?q={word[:-1]}x{word[-1]}'
+
+    def run(self, client, view, name, url, options):
+        """Request ``url`` repeatedly and summarize latency, queries and memory"""
+        latencies = []
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        # Untimed warm-up (fills process-local caches) and memory measurement
+        if options['cold']:
+            cache.clear()
+        tracemalloc.start()
+        response = client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        with connection.execute_wrapper(count_query):
+            for _ in range(options['iterations']):
+                if options['cold']:
+                    cache.clear()
+                queries.append(0)
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        latencies.sort()
+        return {
+            'view': view,
+            'name': name,
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(_percentile(latencies, 50), 2),
+            'p95_ms': round(_percentile(latencies, 95), 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'max_ms': round(latencies[-1], 2),
+            'queries': max(queries),
+            'min_queries': min(queries),
+            'peak_memory_kb': round(peak / 1024),
+            'response_kb': round(len(response.content) / 1024, 1),
+        }
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from forum.caching import FRAGMENT_CACHES
+
+
+class Command(BaseCommand):
+    help = 'Show hit rates of the forum fragment caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them'
+        )
+
+    def handle(self, *args, **options):
+        for fragment_cache in FRAGMENT_CACHES:
+            stats = fragment_cache.stats()
+            hit_rate = 'n/a' if stats['hit_rate'] is None else f"{stats['hit_rate']:.1%}"
+            self.stdout.write(
+                f"{fragment_cache.name}: {stats['hits']} hits, "
+                f"{stats['misses']} misses, hit rate {hit_rate}"
+            )
+            if options['reset']:
+                fragment_cache.reset_stats()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from forum import viewcounts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered thread/resource view counts to the database'
+
+    def handle(self, *args, **options):
+        updated = viewcounts.flush()
+        self.stdout.write(self.style.SUCCESS(f'Updated view counts for {updated} objects'))
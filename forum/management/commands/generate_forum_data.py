@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from forum.datagen import ForumDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-generate synthetic users, threads, replies, likes, tags, course links '
+        'and reports for load testing (deterministic for a given --seed and --now)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Generated users to post and like (default: 1000)')
+        parser.add_argument('--categories', type=int, default=5,
+                            help='Create categories until there are at least this many (default: 5)')
+        parser.add_argument('--threads-per-category', type=int, default=200,
+                            help='Threads to add to each category (default: 200)')
+        parser.add_argument('--replies-per-thread', type=float, default=20,
+                            help='Mean replies per thread (default: 20)')
+        parser.add_argument('--reply-alpha', type=float, default=1.5,
+                            help='Power-law exponent for replies and likes per thread; '
+                                 'lower means a heavier tail (default: 1.5)')
+        parser.add_argument('--max-replies', type=int, default=10_000,
+                            help='Most replies any one thread gets (default: 10000)')
+        parser.add_argument('--thread-likes', type=float, default=3,
+                            help='Mean likes per thread (default: 3)')
+        parser.add_argument('--reply-likes', type=float, default=0.5,
+                            help='Mean likes per reply (default: 0.5)')
+        parser.add_argument('--tags', type=int, default=30,
+                            help='Tags to spread over threads (default: 30)')
+        parser.add_argument('--courses', type=int, default=20,
+                            help='Courses to link threads to (default: 20)')
+        parser.add_argument('--reports', type=int, default=100,
+                            help='Reports on random threads and replies (default: 100)')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread thread creation over this many past days (default: 365)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed (default: 0)')
+        parser.add_argument('--now',
+                            help='Reference time the generated timestamps count back from, '
+                                 'e.g. 2024-01-01T00:00:00Z; fix it to reproduce a seed '
+                                 '(default: the current time)')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows per INSERT transaction (default: 2000)')
+
+    def handle(self, *args, **options):
+        now = None
+        if options['now']:
+            try:
+                now = parse_datetime(options['now'])
+            except ValueError:
+                now = None
+            if now is None:
+                raise CommandError(f"--now is not a valid date and time: {options['now']}")
+            if timezone.is_naive(now):
+                now = timezone.make_aware(now)
+
+        try:
+            generator = ForumDataGenerator(
+                users=options['users'],
+                categories=options['categories'],
+                threads_per_category=options['threads_per_category'],
+                replies_per_thread=options['replies_per_thread'],
+                reply_alpha=options['reply_alpha'],
+                max_replies=options['max_replies'],
+                thread_likes=options['thread_likes'],
+                reply_likes=options['reply_likes'],
+                tags=options['tags'],
+                courses=options['courses'],
+                reports=options['reports'],
+                days=options['days'],
+                seed=options['seed'],
+                now=now,
+                batch_size=options['batch_size'],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        start = time.monotonic()
+        counts = generator.run()
+        elapsed = time.monotonic() - start
+
+        rows = sum(counts.values())
+        self.stdout.write(', '.join(f'{n} {kind.replace("_", " ")}' for kind, n in counts.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 0.001):.0f} rows/s)'
+        ))
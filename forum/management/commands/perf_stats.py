@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+from forum.performance import stats, summarize, SORT_KEYS
+
+
+def _ms(value):
+    return '-' if value is None else f'{value:.0f}'
+
+
+class Command(BaseCommand):
+    help = 'Show per-view latency, SQL and render statistics collected by all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sort',
+            choices=list(SORT_KEYS),
+            default='total',
+            help='Order views by this figure (default: total time spent)'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the statistics as JSON'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Discard the statistics after printing them'
+        )
+
+    def handle(self, *args, **options):
+        rows = summarize(stats.collect(), options['sort'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+        elif not rows:
+            self.stdout.write('No requests recorded yet.')
+        else:
+            self.stdout.write(
+                f"{'view':<45} {'reqs':>7} {'mean':>7} {'p50':>6} {'p95':>6} {'p99':>6} "
+                f"{'max':>7} {'queries':>8} {'q max':>6} {'sql':>7} {'render':>7} {'KB':>6}"
+            )
+            for row in rows:
+                size = '-' if row['size_mean'] is None else f"{row['size_mean'] / 1024:.0f}"
+                self.stdout.write(
+                    f"{row['view']:<45} {row['requests']:>7} {_ms(row['latency_mean']):>7} "
+                    f"{_ms(row['latency_p50']):>6} {_ms(row['latency_p95']):>6} "
+                    f"{_ms(row['latency_p99']):>6} {_ms(row['latency_max']):>7} "
+                    f"{row['queries_mean']:>8.1f} {row['queries_max']:>6} "
+                    f"{row['sql_mean']:>7.1f} {row['render_mean']:>7.1f} {size:>6}"
+                )
+
+        if options['reset']:
+            stats.reset()
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from forum.notifications import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued email notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Recipients whose due notifications are sent per SMTP connection'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling for new notifications'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Seconds to wait between polls when the queue is empty (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = deliver_pending(batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < batch_size:
+                    break
+
+            if total_sent or total_failed or not options['loop']:
+                self.stdout.write(f'Sent {total_sent} notifications, {total_failed} failed')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from forum.search import ensure_sqlite_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite full-text search indexes for threads and replies'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(f'Nothing to do on {connection.vendor}')
+            return
+
+        for table in ensure_sqlite_index(rebuild=True):
+            self.stdout.write(f'Rebuilt {table}')
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
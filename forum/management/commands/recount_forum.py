@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from forum.models import Thread, Reply, ThreadLike, ReplyLike, UserStats
+
+User = get_user_model()
+
+
+def count_of(queryset, field):
+    """Correlated subquery counting ``queryset`` rows grouped on ``field``"""
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(field).annotate(total=Count('pk')).values('total')
+        ),
+        Value(0)
+    )
+
+
+def thread_counter_updates():
+    """
+    Return ``Thread.objects.update()`` kwargs that recompute the denormalized
+    counters from the replies and likes tables in a single statement
+    """
+    replies = Reply.objects.filter(thread=OuterRef('pk'), is_deleted=False)
+    latest = replies.order_by('-created_at', '-pk')
+
+    return {
+        'reply_count': count_of(replies, 'thread'),
+        'like_count': count_of(ThreadLike.objects.filter(thread=OuterRef('pk')), 'thread'),
+        'last_reply': Subquery(latest.values('pk')[:1]),
+        'last_reply_author': Subquery(latest.values('author')[:1]),
+    }
+
+
+def reply_counter_updates():
+    """Return ``Reply.objects.update()`` kwargs that recompute like counts"""
+    return {
+        'like_count': count_of(ReplyLike.objects.filter(reply=OuterRef('pk')), 'reply'),
+    }
+
+
+def user_stats_updates():
+    """Return ``UserStats.objects.update()`` kwargs that recompute every counter"""
+    user = OuterRef('user')
+    replies = Reply.objects.filter(author=user, is_deleted=False)
+    return {
+        'thread_count': count_of(Thread.objects.filter(author=user, is_deleted=False), 'author'),
+        'reply_count': count_of(replies, 'author'),
+        'solution_count': count_of(replies.filter(is_solution=True), 'author'),
+        'likes_received': (
+            count_of(ThreadLike.objects.filter(thread__author=user), 'thread__author')
+            + count_of(ReplyLike.objects.filter(reply__author=user), 'reply__author')
+        ),
+    }
+
+
+def create_missing_user_stats(user_ids, batch_size=1000):
+    """Create empty ``UserStats`` rows for the given users that have none"""
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in user_ids],
+        batch_size=batch_size,
+        ignore_conflicts=True
+    )
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalized forum counters (replies, likes, latest reply, user stats)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of primary keys covered by each UPDATE transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        total = self.recount(Thread, thread_counter_updates(), batch_size)
+        self.stdout.write(f'Recounted {total} threads')
+
+        total = self.recount(Reply, reply_counter_updates(), batch_size)
+        self.stdout.write(f'Recounted {total} replies')
+
+        create_missing_user_stats(
+            User.objects.filter(forum_stats__isnull=True).values_list('pk', flat=True), batch_size
+        )
+        total = self.recount(UserStats, user_stats_updates(), batch_size)
+        self.stdout.write(f'Recounted {total} users')
+
+        self.stdout.write(self.style.SUCCESS('Forum counters rebuilt'))
+
+    def recount(self, model, updates, batch_size):
+        """Apply ``updates`` to ``model`` in primary-key ranges of ``batch_size``"""
+        bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return 0
+
+        total = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            with transaction.atomic():
+                total += model.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size
+                ).update(**updates)
+
+        return total
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from forum.models import Thread
+from forum.ranking import hot_score_expression
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute thread hot scores from their counters. Activity keeps them '
+        'current; run this periodically to catch up, or after changing the weights.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of primary keys covered by each UPDATE transaction'
+        )
+        parser.add_argument(
+            '--active-within',
+            type=int,
+            metavar='DAYS',
+            help='Only threads with activity in the last DAYS days'
+        )
+
+    def handle(self, *args, **options):
+        threads = Thread.objects.all()
+        if options['active_within'] is not None:
+            threads = threads.filter(
+                last_activity__gte=timezone.now() - timedelta(days=options['active_within'])
+            )
+
+        bounds = threads.aggregate(low=Min('pk'), high=Max('pk'))
+        total = 0
+        if bounds['low'] is not None:
+            batch_size = options['batch_size']
+            for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+                with transaction.atomic():
+                    total += threads.filter(
+                        pk__gte=start, pk__lt=start + batch_size
+                    ).update(hot_score=hot_score_expression())
+
+        self.stdout.write(self.style.SUCCESS(f'Refreshed hot scores of {total} threads'))
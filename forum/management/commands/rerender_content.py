@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from forum.models import Thread, Reply
+from forum.rendering import RENDERER_VERSION
+
+
+class Command(BaseCommand):
+    help = 'Re-render stored HTML for threads and replies after markdown/sanitizer changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows rendered and written per transaction'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-render every row, not only rows rendered by an older renderer version'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model in (Thread, Reply):
+            queryset = model.objects.all()
+            if not options['all']:
+                queryset = queryset.exclude(content_html_version=RENDERER_VERSION)
+
+            total = self.rerender(model, queryset, batch_size)
+            self.stdout.write(f'Re-rendered {total} {model._meta.verbose_name_plural.lower()}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored HTML is up to date with renderer version {RENDERER_VERSION}'
+        ))
+
+    def rerender(self, model, queryset, batch_size):
+        """Render ``queryset`` in primary-key ordered batches"""
+        total = 0
+        last_pk = 0
+        queryset = queryset.only('pk', 'content').order_by('pk')
+
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+
+            for obj in batch:
+                obj.render_content()
+
+            with transaction.atomic():
+                model.objects.bulk_update(batch, ['content_html', 'content_html_version'])
+
+            total += len(batch)
+            last_pk = batch[-1].pk
+
+        return total
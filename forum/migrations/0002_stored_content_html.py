@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reply",
+            name="content_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="reply",
+            name="content_html_version",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="content_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="content_html_version",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Thread = apps.get_model("forum", "Thread")
+    Reply = apps.get_model("forum", "Reply")
+    ThreadLike = apps.get_model("forum", "ThreadLike")
+
+    replies = Reply.objects.filter(thread=OuterRef("pk"), is_deleted=False)
+    latest = replies.order_by("-created_at", "-pk")
+    likes = ThreadLike.objects.filter(thread=OuterRef("pk"))
+
+    def count_of(queryset):
+        return Coalesce(
+            Subquery(
+                queryset.order_by()
+                .values("thread")
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            Value(0),
+        )
+
+    Thread.objects.update(
+        reply_count=count_of(replies),
+        like_count=count_of(likes),
+        last_reply=Subquery(latest.values("pk")[:1]),
+        last_reply_author=Subquery(latest.values("author")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0001_initial"),
+        ("forum", "0002_stored_content_html"),
+        ("resources", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thread",
+            name="last_reply",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="forum.reply",
+            ),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="last_reply_author",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="reply_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(
+                fields=["-like_count", "-reply_count"],
+                name="forum_threa_like_co_d0c7a2_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(
+                fields=["category", "-like_count", "-reply_count"],
+                name="forum_threa_categor_e75243_idx",
+            ),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
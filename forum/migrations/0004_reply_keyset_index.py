@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0003_thread_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reply",
+            index=models.Index(
+                fields=["thread", "created_at", "id"],
+                name="forum_reply_thread__885b99_idx",
+            ),
+        ),
+    ]
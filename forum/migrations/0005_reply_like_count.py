@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:27
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_like_counts(apps, schema_editor):
+    Reply = apps.get_model("forum", "Reply")
+    ReplyLike = apps.get_model("forum", "ReplyLike")
+
+    likes = (
+        ReplyLike.objects.filter(reply=OuterRef("pk"))
+        .order_by()
+        .values("reply")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Reply.objects.update(like_count=Coalesce(Subquery(likes), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0004_reply_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reply",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_like_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:31
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def thread_vector(row):
+    return (
+        f"setweight(to_tsvector('english', coalesce({row}title, '')), 'A') || "
+        f"setweight(to_tsvector('english', coalesce({row}content, '')), 'B')"
+    )
+
+
+def reply_vector(row):
+    return f"to_tsvector('english', coalesce({row}content, ''))"
+
+
+# (table, vector expression, indexed text columns)
+TABLES = [
+    ("forum_thread", thread_vector, ("title", "content")),
+    ("forum_reply", reply_vector, ("content",)),
+]
+
+
+# The GIN indexes are created here rather than declared in Meta.indexes:
+# they are PostgreSQL-only, and SQLite would fail to recreate them whenever
+# it rebuilds one of these tables.
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for table, vector, columns in TABLES:
+        schema_editor.execute(
+            f"CREATE OR REPLACE FUNCTION {table}_search_vector_update() "
+            f"RETURNS trigger AS $$ BEGIN "
+            f"NEW.search_vector := {vector('NEW.')}; RETURN NEW; "
+            f"END $$ LANGUAGE plpgsql"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {table}_search_vector_trigger "
+            f"BEFORE INSERT OR UPDATE OF {', '.join(columns)} ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()"
+        )
+        schema_editor.execute(f"UPDATE {table} SET search_vector = {vector('')}")
+        schema_editor.execute(
+            f"CREATE INDEX {table}_search_vector_gin ON {table} USING gin (search_vector)"
+        )
+        for column in columns:
+            schema_editor.execute(
+                f"CREATE INDEX {table}_{column}_trgm ON {table} "
+                f"USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for table, _, columns in TABLES:
+        schema_editor.execute(
+            f"DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}"
+        )
+        schema_editor.execute(f"DROP FUNCTION IF EXISTS {table}_search_vector_update()")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_vector_gin")
+        for column in columns:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0005_reply_like_count"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="reply",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0007_notification_outbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thread",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0008_thread_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(fields=["-views"], name="forum_threa_views_1d022e_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(
+                fields=["-created_at"], name="forum_threa_created_88a581_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(
+                fields=["category", "-is_pinned", "-last_activity"],
+                name="forum_threa_categor_c7bf58_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(
+                fields=["category", "-is_pinned", "-like_count", "-reply_count"],
+                name="forum_threa_categor_cdf8c8_idx",
+            ),
+        ),
+    ]
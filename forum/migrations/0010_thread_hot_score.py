@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:00
+
+import forum.ranking
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_hot_scores(apps, schema_editor):
+    Thread = apps.get_model("forum", "Thread")
+    Thread.objects.update(hot_score=forum.ranking.hot_score_expression())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0001_initial"),
+        ("forum", "0009_thread_listing_indexes"),
+        ("resources", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thread",
+            name="hot_score",
+            field=models.FloatField(
+                default=forum.ranking.initial_hot_score, editable=False
+            ),
+        ),
+        migrations.RunPython(populate_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(
+                fields=["-hot_score"], name="forum_threa_hot_sco_58c170_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="thread",
+            index=models.Index(
+                fields=["category", "-is_pinned", "-hot_score"],
+                name="forum_threa_categor_2bd5b1_idx",
+            ),
+        ),
+    ]
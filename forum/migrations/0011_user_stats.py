@@ -0,0 +1,81 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    UserStats = apps.get_model("forum", "UserStats")
+    Thread = apps.get_model("forum", "Thread")
+    Reply = apps.get_model("forum", "Reply")
+    ThreadLike = apps.get_model("forum", "ThreadLike")
+    ReplyLike = apps.get_model("forum", "ReplyLike")
+
+    def count_of(queryset, field):
+        return Coalesce(
+            Subquery(
+                queryset.order_by()
+                .values(field)
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            Value(0),
+        )
+
+    user = OuterRef("user")
+    replies = Reply.objects.filter(author=user, is_deleted=False)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in User.objects.values_list("pk", flat=True)],
+        batch_size=1000,
+    )
+    UserStats.objects.update(
+        thread_count=count_of(
+            Thread.objects.filter(author=user, is_deleted=False), "author"
+        ),
+        reply_count=count_of(replies, "author"),
+        solution_count=count_of(replies.filter(is_solution=True), "author"),
+        likes_received=(
+            count_of(ThreadLike.objects.filter(thread__author=user), "thread__author")
+            + count_of(ReplyLike.objects.filter(reply__author=user), "reply__author")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_notification_frequency"),
+        ("forum", "0010_thread_hot_score"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="forum_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("thread_count", models.PositiveIntegerField(default=0)),
+                ("reply_count", models.PositiveIntegerField(default=0)),
+                ("likes_received", models.PositiveIntegerField(default=0)),
+                ("solution_count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "User stats",
+                "verbose_name_plural": "User stats",
+            },
+        ),
+        migrations.RunPython(populate_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0012_moderation_actions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingViewCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("object_id", models.BigIntegerField()),
+                ("views", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("views__gt", 0)),
+                        fields=["id"],
+                        name="pending_view_count_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="pendingviewcount",
+            constraint=models.UniqueConstraint(
+                fields=("model", "object_id"), name="unique_pending_view_count"
+            ),
+        ),
+    ]
@@ -1,15 +1,66 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from django.utils.text import slugify
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.utils.safestring import mark_safe
 from courses.models import Course
 from resources.models import Resource
 from markdownx.models import MarkdownxField
-from markdownx.utils import markdownify
+from .ranking import hot_score_expression, initial_hot_score
+from .rendering import render_markdown, RENDERER_VERSION
 
 User = get_user_model()
 
 
+class RenderedContentMixin:
+    """
+    Keeps a pre-rendered, sanitized copy of the markdown ``content`` field in
+    ``content_html`` so pages don't run the markdown pipeline on every view.
+    """
+    
+    def render_content(self):
+        """Render markdown content into the stored HTML fields"""
+        self.content_html = render_markdown(self.content)
+        self.content_html_version = RENDERER_VERSION
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *update_fields, 'content_html', 'content_html_version'
+                }
+        super().save(*args, **kwargs)
+    
+    def get_content_html(self):
+        """Return stored HTML, rendering on the fly if it is missing or stale"""
+        if self.content_html_version != RENDERER_VERSION:
+            self.render_content()
+        return mark_safe(self.content_html)
+
+
+class DenormalizedFieldsMixin:
+    """
+    Columns listed in ``DENORMALIZED_FIELDS`` are only ever written with
+    targeted UPDATEs; a full save() of a possibly stale instance must not
+    write them back.
+    """
+    
+    DENORMALIZED_FIELDS = ()
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
 class Category(models.Model):
     """Forum category for organizing discussions"""
     
@@ -60,11 +111,15 @@ def __str__(self):
         return self.name
 
 
-class Thread(models.Model):
+class Thread(DenormalizedFieldsMixin, RenderedContentMixin, models.Model):
     """Discussion thread"""
     
     title = models.CharField(max_length=200)
     content = MarkdownxField()
+    content_html = models.TextField(blank=True, editable=False)
+    content_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Maintained by a database trigger on PostgreSQL (see forum.search)
+    search_vector = SearchVectorField(null=True, editable=False)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -102,20 +157,62 @@ class Thread(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     last_activity = models.DateTimeField(auto_now_add=True)
     
+    # Denormalized counters, kept in sync by Reply/ThreadLike and rebuilt
+    # by the recount_forum management command
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    last_reply = models.ForeignKey(
+        'Reply',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    last_reply_author = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    
+    # Time-decayed engagement (see forum.ranking), set along with the
+    # counters and rebuilt by the refresh_hot_scores management command
+    hot_score = models.FloatField(default=initial_hot_score, editable=False)
+    
+    # Bumped whenever the cached listing row for this thread goes stale
+    # (see forum.signals)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ['-is_pinned', '-last_activity']
         indexes = [
             models.Index(fields=['-last_activity']),
             models.Index(fields=['category', '-last_activity']),
+            models.Index(fields=['-like_count', '-reply_count']),
+            models.Index(fields=['category', '-like_count', '-reply_count']),
+            models.Index(fields=['-views']),
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['category', '-is_pinned', '-last_activity']),
+            models.Index(fields=['category', '-is_pinned', '-like_count', '-reply_count']),
+            models.Index(fields=['-hot_score']),
+            models.Index(fields=['category', '-is_pinned', '-hot_score']),
         ]
     
+    DENORMALIZED_FIELDS = (
+        'views', 'reply_count', 'like_count', 'last_reply', 'last_reply_author',
+        'search_vector', 'version', 'hot_score',
+    )
+    
     def __str__(self):
         return self.title
     
     @property
     def formatted_content(self):
         """Return content as HTML"""
-        return markdownify(self.content)
+        return self.get_content_html()
     
     def get_reply_count(self):
         """Get count of non-deleted replies"""
@@ -130,10 +227,58 @@ def update_last_activity(self):
         self.last_activity = timezone.now()
         self.save(update_fields=['last_activity'])
     
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new and not self.is_deleted:
+                UserStats.add(self.author_id, thread_count=1)
+    
+    def soft_delete(self):
+        """Soft delete the thread"""
+        if self.is_deleted:
+            return
+        self.is_deleted = True
+        with transaction.atomic():
+            self.save(update_fields=['is_deleted'])
+            UserStats.add(self.author_id, thread_count=-1)
+    
+    def record_reply(self, reply):
+        """Count a newly posted reply and make it the thread's latest reply"""
+        self.last_activity = timezone.now()
+        self.last_reply = reply
+        self.last_reply_author_id = reply.author_id
+        Thread.objects.filter(pk=self.pk).update(
+            reply_count=F('reply_count') + 1,
+            hot_score=hot_score_expression(reply_count=F('reply_count') + 1),
+            last_reply=reply,
+            last_reply_author_id=reply.author_id,
+            last_activity=self.last_activity,
+        )
+    
+    def refresh_reply_stats(self):
+        """Recompute reply_count and the latest reply from the replies table"""
+        replies = self.replies.filter(is_deleted=False)
+        latest = replies.order_by('-created_at', '-pk').only('pk', 'author_id').first()
+        self.reply_count = replies.count()
+        self.last_reply = latest
+        self.last_reply_author_id = latest.author_id if latest else None
+        Thread.objects.filter(pk=self.pk).update(
+            reply_count=self.reply_count,
+            hot_score=hot_score_expression(reply_count=self.reply_count),
+            last_reply=latest,
+            last_reply_author_id=self.last_reply_author_id,
+        )
+    
     def increment_views(self):
-        """Increment view count"""
-        self.views += 1
-        self.save(update_fields=['views'])
+        """Increment view count (buffered, see forum.viewcounts)"""
+        from .viewcounts import increment
+        increment(self)
+    
+    @classmethod
+    def view_count_updates(cls, views):
+        """Columns forum.viewcounts sets along with a new ``views`` value"""
+        return {'hot_score': hot_score_expression(views=views)}
     
     def can_edit(self, user):
         """Check if user can edit this thread"""
@@ -144,10 +289,14 @@ def can_delete(self, user):
         return user == self.author or user.can_moderate()
 
 
-class Reply(models.Model):
+class Reply(DenormalizedFieldsMixin, RenderedContentMixin, models.Model):
     """Reply to a thread"""
     
     content = MarkdownxField()
+    content_html = models.TextField(blank=True, editable=False)
+    content_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Maintained by a database trigger on PostgreSQL (see forum.search)
+    search_vector = SearchVectorField(null=True, editable=False)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -177,10 +326,18 @@ class Reply(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     edited_at = models.DateTimeField(null=True, blank=True)
     
+    # Denormalized counter, kept in sync by ReplyLike
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    DENORMALIZED_FIELDS = ('like_count', 'search_vector')
+    
     class Meta:
         ordering = ['created_at']
         verbose_name = "Reply"
         verbose_name_plural = "Replies"
+        indexes = [
+            models.Index(fields=['thread', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Reply by {self.author} on {self.thread.title[:30]}"
@@ -189,20 +346,45 @@ def __str__(self):
     def formatted_content(self):
         """Return content as HTML"""
         if self.is_deleted:
-            return "<p><em>[This reply has been deleted]</em></p>"
-        return markdownify(self.content)
+            return mark_safe("<p><em>[This reply has been deleted]</em></p>")
+        return self.get_content_html()
     
     def save(self, *args, **kwargs):
-        # Update thread's last activity on new reply
+        # Update thread's counters and last activity on new reply
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        if is_new and not self.is_deleted:
-            self.thread.update_last_activity()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new and not self.is_deleted:
+                self.thread.record_reply(self)
+                UserStats.add(self.author_id, reply_count=1)
     
     def soft_delete(self):
         """Soft delete the reply"""
+        if self.is_deleted:
+            return
         self.is_deleted = True
-        self.save(update_fields=['is_deleted'])
+        with transaction.atomic():
+            self.save(update_fields=['is_deleted'])
+            self.thread.refresh_reply_stats()
+            UserStats.add(
+                self.author_id, reply_count=-1, solution_count=-1 if self.is_solution else 0
+            )
+    
+    def mark_as_solution(self):
+        """Make this reply the only solution of its thread"""
+        with transaction.atomic():
+            previous = Reply.objects.filter(
+                thread_id=self.thread_id, is_solution=True
+            ).exclude(pk=self.pk)
+            for author_id in previous.filter(is_deleted=False).values_list('author_id', flat=True):
+                UserStats.add(author_id, solution_count=-1)
+            previous.update(is_solution=False)
+            
+            if not self.is_solution:
+                self.is_solution = True
+                self.save(update_fields=['is_solution'])
+                if not self.is_deleted:
+                    UserStats.add(self.author_id, solution_count=1)
     
     def can_edit(self, user):
         """Check if user can edit this reply"""
@@ -234,6 +416,27 @@ class Meta:
     
     def __str__(self):
         return f"{self.user} likes {self.thread.title[:30]}"
+    
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                Thread.objects.filter(pk=self.thread_id).update(
+                    like_count=F('like_count') + 1,
+                    hot_score=hot_score_expression(like_count=F('like_count') + 1),
+                )
+                UserStats.add(self.thread.author_id, likes_received=1)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Thread.objects.filter(pk=self.thread_id, like_count__gt=0).update(
+                like_count=F('like_count') - 1,
+                hot_score=hot_score_expression(like_count=F('like_count') - 1),
+            )
+            UserStats.add(self.thread.author_id, likes_received=-1)
+        return result
 
 
 class ReplyLike(models.Model):
@@ -257,6 +460,25 @@ class Meta:
     
     def __str__(self):
         return f"{self.user} likes reply by {self.reply.author}"
+    
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                Reply.objects.filter(pk=self.reply_id).update(
+                    like_count=F('like_count') + 1
+                )
+                UserStats.add(self.reply.author_id, likes_received=1)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Reply.objects.filter(pk=self.reply_id, like_count__gt=0).update(
+                like_count=F('like_count') - 1
+            )
+            UserStats.add(self.reply.author_id, likes_received=-1)
+        return result
 
 
 class Report(models.Model):
@@ -318,15 +540,27 @@ class ReportReason(models.TextChoices):
         related_name='reports_handled'
     )
     moderator_notes = models.TextField(blank=True)
+    moderation_action = models.ForeignKey(
+        'ModerationAction',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='reports'
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
     
+    # Reports still waiting for a moderator
+    OPEN_STATUSES = [ReportStatus.PENDING, ReportStatus.REVIEWED]
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', '-created_at']),
+            # Grouping the queue by reported content
+            models.Index(fields=['status', 'thread', 'reply']),
         ]
     
     def __str__(self):
@@ -335,19 +569,35 @@ def __str__(self):
     
     def resolve(self, moderator, notes=''):
         """Mark report as resolved"""
-        self.status = self.ReportStatus.RESOLVED
-        self.moderator = moderator
-        self.moderator_notes = notes
-        self.resolved_at = timezone.now()
-        self.save()
+        self.close(Report.objects.filter(pk=self.pk), self.ReportStatus.RESOLVED, moderator, notes)
+        self.refresh_from_db()
     
     def dismiss(self, moderator, notes=''):
         """Dismiss the report"""
-        self.status = self.ReportStatus.DISMISSED
-        self.moderator = moderator
-        self.moderator_notes = notes
-        self.resolved_at = timezone.now()
-        self.save()
+        self.close(Report.objects.filter(pk=self.pk), self.ReportStatus.DISMISSED, moderator, notes)
+        self.refresh_from_db()
+    
+    @classmethod
+    def close(cls, reports, status, moderator, notes=''):
+        """
+        Give the open reports among ``reports`` a closing ``status`` in one
+        UPDATE, linked to a single ModerationAction recording who closed
+        them. Returns the number of reports closed.
+        """
+        with transaction.atomic():
+            action = ModerationAction.objects.create(
+                moderator=moderator, status=status, notes=notes
+            )
+            closed = reports.filter(status__in=cls.OPEN_STATUSES).update(
+                status=status,
+                moderator=moderator,
+                moderator_notes=notes,
+                moderation_action=action,
+                resolved_at=action.created_at,
+            )
+            if not closed:
+                action.delete()
+        return closed
     
     def get_reported_content(self):
         """Get the content being reported"""
@@ -356,4 +606,157 @@ def get_reported_content(self):
     def get_content_author(self):
         """Get the author of reported content"""
         content = self.get_reported_content()
-        return content.author if content else None
\ No newline at end of file
+        return content.author if content else None
+
+
+class ModerationAction(models.Model):
+    """Audit record of one moderator decision, covering every report it closed"""
+    
+    moderator = models.ForeignKey(
+        User,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='moderation_actions'
+    )
+    status = models.CharField(max_length=10, choices=Report.ReportStatus.choices)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_status_display()} by {self.moderator} at {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class UserStats(models.Model):
+    """
+    A user's forum activity counters: threads and replies not deleted,
+    likes received on either, and replies marked as solutions. Kept in sync
+    by the thread, reply and like methods above and rebuilt by the
+    recount_forum management command.
+    """
+    
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='forum_stats'
+    )
+    thread_count = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    solution_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "User stats"
+        verbose_name_plural = "User stats"
+    
+    def __str__(self):
+        return f"Stats for {self.user}"
+    
+    @classmethod
+    def add(cls, user_id, **deltas):
+        """Add ``counter=n`` to a user's counters, creating their row if needed"""
+        updates = {
+            field: Greatest(F(field) + n, Value(0)) for field, n in deltas.items() if n
+        }
+        if user_id is None or not updates:
+            return
+        if not cls.objects.filter(user_id=user_id).update(**updates):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(**updates)
+    
+    @classmethod
+    def for_user(cls, user):
+        """The user's stats, all zero if they have none yet"""
+        return cls.objects.filter(user=user).first() or cls(user=user)
+
+
+class Notification(models.Model):
+    """
+    Outbox entry for an email notification. Requests only create these rows;
+    ``manage.py process_notifications`` renders and delivers them.
+    """
+    
+    class Kind(models.TextChoices):
+        REPLY = 'reply', 'New Reply'
+        MENTION = 'mention', 'Mention'
+        THREAD_LOCKED = 'thread_locked', 'Thread Locked'
+    
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+    
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    actor = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    thread = models.ForeignKey(
+        Thread,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    reply = models.ForeignKey(
+        Reply,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    
+    # Delivery state
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.recipient} ({self.get_status_display()})"
+
+
+class PendingViewCount(models.Model):
+    """
+    Page views of one object that workers have handed over but that are not
+    yet added to its ``views`` column (see forum.viewcounts). A drain deletes
+    the rows it empties; a spill locks a row before adding to it.
+    """
+    
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='unique_pending_view_count'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(views__gt=0), name='pending_view_count_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.views} views of {self.model} {self.object_id}"
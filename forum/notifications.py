@@ -1,127 +1,319 @@
-from django.core.mail import send_mail
+"""
+Email notifications.
+
+The ``send_*`` functions called from views only queue a Notification row, so
+a slow mail server never holds up a request. ``manage.py process_notifications``
+delivers the queue in batches over one SMTP connection per batch, holding no
+transaction or row locks while it talks to the mail server. Failed messages
+are retried with exponential backoff up to FORUM_NOTIFICATION_MAX_ATTEMPTS
+times.
+
+Users who chose an hourly or daily digest have their notifications scheduled
+for the next digest slot. All of a user's notifications that fall due
+together are rendered into a single message.
+"""
+import logging
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.sites.models import Site
 
+from .models import Notification
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'FORUM_NOTIFICATION_MAX_ATTEMPTS', 5)
+DIGEST_HOUR = getattr(settings, 'FORUM_DIGEST_HOUR', 8)
+MAX_MENTIONS = getattr(settings, 'FORUM_MAX_MENTIONS', 10)
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 6 * 60 * 60
+# How long a worker may take to deliver the notifications it claimed
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# "@handle" not preceded by a word character, so email addresses don't match
+MENTION_PATTERN = re.compile(r'(?<![\w@])@([\w.+-]+)')
+
+# kind -> (template name, subject format)
+TEMPLATES = {
+    Notification.Kind.REPLY: (
+        'forum/emails/reply_notification', 'New reply to your thread: {thread.title}'
+    ),
+    Notification.Kind.MENTION: (
+        'forum/emails/mention_notification', '{actor_name} mentioned you in: {thread.title}'
+    ),
+    Notification.Kind.THREAD_LOCKED: (
+        'forum/emails/thread_locked', 'Your thread has been locked: {thread.title}'
+    ),
+}
+
+
+def next_delivery_time(frequency, now=None):
+    """When a notification queued at ``now`` is due for a user's ``frequency``"""
+    now = now or timezone.now()
+    if frequency == User.NotificationFrequency.HOURLY:
+        return (now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+    if frequency == User.NotificationFrequency.DAILY:
+        local = timezone.localtime(now)
+        due = local.replace(hour=DIGEST_HOUR, minute=0, second=0, microsecond=0)
+        if due <= local:
+            due += timedelta(days=1)
+        return due
+    return now
+
+
+def _enqueue(kind, recipient, actor, thread, reply=None):
+    Notification.objects.create(
+        kind=kind,
+        recipient=recipient,
+        actor=actor,
+        thread=thread,
+        reply=reply,
+        next_attempt_at=next_delivery_time(recipient.notification_frequency),
+    )
+
 
 def send_reply_notification(reply):
-    """Send email notification when someone replies to a thread"""
+    """Queue an email to the thread author when someone replies to a thread"""
     thread = reply.thread
-    thread_author = thread.author
-    
+
     # Don't send notification if replying to own thread
-    if reply.author == thread_author:
+    if reply.author_id == thread.author_id:
         return
-    
-    # Get site domain
-    current_site = Site.objects.get_current()
-    domain = current_site.domain
-    
-    # Build thread URL
-    thread_url = f"http://{domain}{reverse('forum:thread_detail', kwargs={'pk': thread.pk})}"
-    
-    subject = f"New reply to your thread: {thread.title}"
-    
-    context = {
-        'thread': thread,
-        'reply': reply,
-        'thread_url': thread_url,
-        'recipient': thread_author,
-    }
-    
-    # Render email templates
-    html_message = render_to_string('forum/emails/reply_notification.html', context)
-    plain_message = render_to_string('forum/emails/reply_notification.txt', context)
-    
-    try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[thread_author.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-    except Exception as e:
-        print(f"Failed to send email notification: {e}")
+
+    _enqueue(Notification.Kind.REPLY, thread.author, reply.author, thread, reply)
 
 
 def send_mention_notification(user, thread, mentioning_user):
-    """Send email notification when someone mentions a user"""
-    
+    """Queue an email when someone mentions a user"""
+
     # Don't send notification if mentioning self
     if user == mentioning_user:
         return
-    
-    # Get site domain
-    current_site = Site.objects.get_current()
-    domain = current_site.domain
-    
-    # Build thread URL
-    thread_url = f"http://{domain}{reverse('forum:thread_detail', kwargs={'pk': thread.pk})}"
-    
-    subject = f"{mentioning_user.get_display_name()} mentioned you in: {thread.title}"
-    
-    context = {
-        'thread': thread,
-        'thread_url': thread_url,
-        'recipient': user,
-        'mentioning_user': mentioning_user,
-    }
-    
-    # Render email templates
-    html_message = render_to_string('forum/emails/mention_notification.html', context)
-    plain_message = render_to_string('forum/emails/mention_notification.txt', context)
-    
-    try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
+
+    _enqueue(Notification.Kind.MENTION, user, mentioning_user, thread)
+
+
+def find_mentions(text):
+    """Distinct ``@username`` handles in ``text``, in order of appearance"""
+    handles = dict.fromkeys(handle.rstrip('.') for handle in MENTION_PATTERN.findall(text or ''))
+    return [handle for handle in handles if handle]
+
+
+def send_mention_notifications(thread, author, content, reply=None, previous_content=''):
+    """
+    Queue a mention notification for each user @mentioned in ``content`` but
+    not already in ``previous_content`` (when editing). All handles are
+    resolved in one query, and at most FORUM_MAX_MENTIONS users are notified
+    per post. On a reply the thread author is skipped, because they already
+    get a reply notification.
+    """
+    already_mentioned = set(find_mentions(previous_content))
+    usernames = [
+        handle for handle in find_mentions(content) if handle not in already_mentioned
+    ][:MAX_MENTIONS]
+    if not usernames:
+        return []
+
+    excluded = {author.pk}
+    if reply is not None:
+        excluded.add(thread.author_id)
+
+    now = timezone.now()
+    notifications = [
+        Notification(
+            kind=Notification.Kind.MENTION,
+            recipient=user,
+            actor=author,
+            thread=thread,
+            reply=reply,
+            next_attempt_at=next_delivery_time(user.notification_frequency, now),
         )
-    except Exception as e:
-        print(f"Failed to send mention notification: {e}")
+        for user in User.objects.filter(
+            username__in=usernames, is_active=True
+        ).exclude(pk__in=excluded).only('pk', 'notification_frequency')
+    ]
+    return Notification.objects.bulk_create(notifications)
 
 
 def send_thread_locked_notification(thread, locked_by):
-    """Send notification when a thread is locked"""
-    
+    """Queue an email to the thread author when a thread is locked"""
+
     # Only notify thread author
-    if thread.author == locked_by:
+    if thread.author_id == locked_by.pk:
         return
-    
-    # Get site domain
-    current_site = Site.objects.get_current()
-    domain = current_site.domain
-    
-    # Build thread URL
-    thread_url = f"http://{domain}{reverse('forum:thread_detail', kwargs={'pk': thread.pk})}"
-    
-    subject = f"Your thread has been locked: {thread.title}"
-    
+
+    _enqueue(Notification.Kind.THREAD_LOCKED, thread.author, locked_by, thread)
+
+
+def _thread_url(thread, domain):
+    return f"http://{domain}{reverse('forum:thread_detail', kwargs={'pk': thread.pk})}"
+
+
+def _email(recipient, subject, template, context, connection):
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=render_to_string(f'{template}.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient.email],
+        connection=connection,
+    )
+    message.attach_alternative(render_to_string(f'{template}.html', context), 'text/html')
+    return message
+
+
+def build_message(notification, domain, connection=None):
+    """Render ``notification`` into an email message"""
+    template, subject = TEMPLATES[notification.kind]
+    thread = notification.thread
+    actor = notification.actor
+
     context = {
         'thread': thread,
-        'thread_url': thread_url,
-        'recipient': thread.author,
-        'locked_by': locked_by,
+        'reply': notification.reply,
+        'thread_url': _thread_url(thread, domain),
+        'recipient': notification.recipient,
+        'mentioning_user': actor,
+        'locked_by': actor,
     }
-    
-    # Render email templates
-    html_message = render_to_string('forum/emails/thread_locked.html', context)
-    plain_message = render_to_string('forum/emails/thread_locked.txt', context)
-    
-    try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[thread.author.email],
-            html_message=html_message,
-            fail_silently=False,
+    subject = subject.format(
+        thread=thread,
+        actor_name=actor.get_display_name() if actor else 'Someone',
+    )
+    return _email(notification.recipient, subject, template, context, connection)
+
+
+def build_digest(notifications, domain, connection=None):
+    """Render several notifications for the same recipient into one message"""
+    recipient = notifications[0].recipient
+    items = [
+        {'notification': n, 'thread_url': _thread_url(n.thread, domain)}
+        for n in sorted(notifications, key=lambda n: n.created_at)
+    ]
+    context = {
+        'recipient': recipient,
+        'items': items,
+        'frequency': recipient.get_notification_frequency_display().lower(),
+    }
+    subject = f"Your StudyDeck Forum digest: {len(items)} new notification{'s' if len(items) != 1 else ''}"
+    return _email(recipient, subject, 'forum/emails/digest', context, connection)
+
+
+def _group_messages(batch, domain, connection):
+    """
+    Yield ``(build, notifications)`` pairs: one message per notification for
+    immediate recipients and one digest per digest recipient
+    """
+    digests = defaultdict(list)
+    for notification in batch:
+        frequency = notification.recipient.notification_frequency
+        if frequency == User.NotificationFrequency.IMMEDIATE:
+            yield (lambda n=notification: build_message(n, domain, connection)), [notification]
+        else:
+            digests[notification.recipient_id].append(notification)
+
+    for notifications in digests.values():
+        yield (lambda ns=notifications: build_digest(ns, domain, connection)), notifications
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt after ``attempts`` failures"""
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def _claim(batch_size, now):
+    """
+    Lease the due notifications of up to ``batch_size`` recipients to this
+    worker, counting the attempt. Their next attempt moves CLAIM_TIMEOUT
+    ahead, so other workers skip them and, should this one die before
+    recording how delivery went, they fall due again.
+    """
+    with transaction.atomic():
+        # skip_locked lets several workers share the queue on PostgreSQL
+        due = Notification.objects.select_for_update(skip_locked=True).filter(
+            status=Notification.Status.PENDING, next_attempt_at__lte=now
         )
+        recipient_ids = set(
+            due.order_by('next_attempt_at', 'recipient_id')
+            .values_list('recipient_id', flat=True)[:batch_size]
+        )
+        # Take every due row of those recipients, so that a digest is never
+        # split between batches, whatever the cut or the rows' due times
+        ids = list(due.filter(recipient_id__in=recipient_ids).values_list('pk', flat=True))
+        Notification.objects.filter(pk__in=ids).update(
+            attempts=F('attempts') + 1, next_attempt_at=now + CLAIM_TIMEOUT
+        )
+    return list(
+        Notification.objects.filter(pk__in=ids).select_related(
+            'recipient', 'actor', 'thread', 'reply', 'reply__author'
+        ).order_by('recipient_id', 'pk')
+    )
+
+
+def deliver_pending(batch_size=100):
+    """
+    Deliver the due notifications of up to ``batch_size`` recipients over a
+    single connection.
+    Rows are claimed in a short transaction and mail is sent outside it, the
+    outcome of each message being recorded as soon as it is known.
+    Returns ``(sent, failed)`` notification counts for the batch.
+    """
+    now = timezone.now()
+    batch = _claim(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    domain = Site.objects.get_current().domain
+    sent = failed = 0
+
+    try:
+        connection = get_connection(fail_silently=False)
+        connection.open()
     except Exception as e:
-        print(f"Failed to send thread locked notification: {e}")
+        # Nothing could be sent; back the whole batch off
+        logger.warning('Could not connect to the mail server: %s', e)
+        _record_failure(batch, e, now)
+        return 0, len(batch)
+
+    try:
+        for build, notifications in _group_messages(batch, domain, connection):
+            try:
+                if not notifications[0].recipient.email:
+                    raise ValueError('Recipient has no email address')
+                build().send()
+            except Exception as e:
+                logger.warning(
+                    'Failed to send notifications %s: %s',
+                    ', '.join(str(n.pk) for n in notifications), e
+                )
+                _record_failure(notifications, e, now)
+                failed += len(notifications)
+            else:
+                Notification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+                    status=Notification.Status.SENT, sent_at=timezone.now(), last_error=''
+                )
+                sent += len(notifications)
+    finally:
+        connection.close()
+
+    return sent, failed
+
+
+def _record_failure(notifications, error, now):
+    """Back claimed notifications off, giving up after MAX_ATTEMPTS attempts"""
+    for notification in notifications:
+        notification.last_error = str(error)[:1000]
+        if notification.attempts >= MAX_ATTEMPTS:
+            notification.status = Notification.Status.FAILED
+        else:
+            notification.next_attempt_at = now + retry_delay(notification.attempts)
+    Notification.objects.bulk_update(notifications, ['status', 'next_attempt_at', 'last_error'])
@@ -0,0 +1,233 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with ``WHERE (sort keys) > (last row's sort keys)`` instead
+of OFFSET, so the cost of a page doesn't grow with how deep it is. The
+ordering must end in a unique field (normally ``id``) so ties are broken
+consistently. Cursors are URL-safe base64 of the last row's key values.
+
+``cached_count`` and ``CachedCountPaginator`` count the rows of a listing
+on its bare filtered queryset, cache the result per filter combination and,
+on PostgreSQL, use the planner's estimate for large results.
+"""
+import base64
+import hashlib
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = getattr(settings, 'FORUM_COUNT_ESTIMATE_THRESHOLD', 50_000)
+
+
+def _parse_ordering(ordering):
+    return [
+        (field[1:], True) if field.startswith('-') else (field, False)
+        for field in ordering
+    ]
+
+
+def encode_cursor(values):
+    """Encode a list of JSON-serializable key values as an opaque cursor"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by ``encode_cursor``; raises ValueError if invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the page after it"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering`` (e.g. ``['created_at', 'id']`` or
+    ``['-like_count', '-id']``) using opaque cursors.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.keys = _parse_ordering(self.ordering)
+        self.per_page = per_page
+
+    def _field(self, name):
+        return self.queryset.model._meta.get_field(name)
+
+    def cursor_for(self, obj):
+        """Return the cursor that starts the page right after ``obj``"""
+        values = []
+        for name, _ in self.keys:
+            field = self._field(name)
+            values.append(field.value_to_string(obj))
+        return encode_cursor(values)
+
+    def _decode(self, cursor):
+        values = decode_cursor(cursor)
+        if len(values) != len(self.keys):
+            raise ValueError('Invalid cursor')
+        # A tampered cursor can hold anything JSON can
+        try:
+            values = [
+                self._field(name).to_python(value)
+                for (name, _), value in zip(self.keys, values)
+            ]
+        except (ValidationError, TypeError, ValueError, OverflowError) as e:
+            raise ValueError('Invalid cursor') from e
+        if None in values:
+            raise ValueError('Invalid cursor')
+        return values
+
+    def after_filter(self, values):
+        """``Q`` matching rows that sort strictly after the given key values"""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for (prev_name, _), prev_value in zip(self.keys[:i], values[:i]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        # Implied by the above, but unlike the OR it can be used to seek an
+        # index on the leading key instead of filtering every earlier row
+        name, descending = self.keys[0]
+        return Q(**{f"{name}__{'lte' if descending else 'gte'}": values[0]}) & condition
+
+    def page(self, cursor=None):
+        """
+        Return the page following ``cursor`` (the first page if it is empty).
+        Raises ValueError for a malformed cursor.
+        """
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self.after_filter(self._decode(cursor)))
+
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.cursor_for(rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+    def cursor_for_page_containing(self, obj):
+        """
+        Return the cursor of the page that contains ``obj`` when paging from
+        the start, or None if it is on the first page
+        """
+        position = self.queryset.filter(
+            ~self.after_filter([getattr(obj, name) for name, _ in self.keys])
+        ).exclude(pk=obj.pk).count()
+        page_start = position - position % self.per_page
+        if page_start == 0:
+            return None
+        previous = self.queryset.order_by(*self.ordering)[page_start - 1]
+        return self.cursor_for(previous)
+
+
+# ``value`` rows, or about that many when ``is_estimate``
+RowCount = namedtuple('RowCount', ['value', 'is_estimate'])
+
+
+def planner_estimate(queryset):
+    """The planner's row estimate for ``queryset``, or None if the database has none"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset, namespace, estimate_above=ESTIMATE_THRESHOLD):
+    """
+    Return a ``RowCount`` of ``queryset``, cached in ``namespace`` under its
+    SQL. Pass the filtered base queryset, without annotations or joins only
+    needed for display, so the count stays cheap. Above ``estimate_above``
+    rows the planner's estimate is used where there is one.
+    """
+    queryset = queryset.order_by()
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return RowCount(0, False)
+    key = hashlib.sha1(repr((sql, params)).encode('utf-8')).hexdigest()
+
+    count = namespace.get(key)
+    if count is None:
+        estimate = planner_estimate(queryset)
+        if estimate is not None and estimate > estimate_above:
+            count = RowCount(estimate, True)
+        else:
+            count = RowCount(queryset.count(), False)
+        namespace.set(key, count)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """
+    ``Paginator`` that takes its count from ``cached_count`` on
+    ``count_queryset`` instead of counting the (annotated) object list
+    """
+
+    def __init__(self, object_list, per_page, count_queryset, namespace, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_queryset = count_queryset
+        self.namespace = namespace
+
+    @cached_property
+    def row_count(self):
+        return cached_count(self.count_queryset, self.namespace)
+
+    @cached_property
+    def count(self):
+        return self.row_count.value
+
+    @property
+    def count_is_estimate(self):
+        return self.row_count.is_estimate
+
+    def page(self, number):
+        page = super().page(number)
+        if self.count_is_estimate and page.number > 1 and not page.object_list:
+            # The estimate ran past the rows: count them exactly and serve
+            # the last page that has any
+            self.row_count = RowCount(self.count_queryset.count(), False)
+            for name in ('count', 'num_pages'):
+                self.__dict__.pop(name, None)
+            page = super().page(min(page.number, self.num_pages))
+        return page
@@ -0,0 +1,266 @@
+"""
+Per-view performance statistics.
+
+``PerformanceMiddleware`` records, for every request, the latency, the number
+and total time of SQL queries, the time spent rendering templates and the
+response size. Samples are grouped by method and URL name into fixed-bucket
+histograms in process memory, so recording one costs a few additions.
+
+At most every FORUM_PERF_PUBLISH_INTERVAL seconds, each worker stores a
+snapshot of its histograms in the shared cache. The moderators' stats page
+and ``manage.py perf_stats`` merge the snapshots of all workers.
+"""
+import bisect
+import copy
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends import django as django_backend
+
+from .caching import CacheNamespace
+
+PUBLISH_INTERVAL = getattr(settings, 'FORUM_PERF_PUBLISH_INTERVAL', 30)
+
+# Snapshots of workers that stopped publishing expire after this long
+SNAPSHOT_TIMEOUT = 7 * 24 * 60 * 60
+
+# metric -> bucket upper bounds (ms, queries or bytes)
+METRICS = {
+    'latency': [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000],
+    'queries': [0, 1, 2, 5, 10, 20, 50, 100, 200, 500],
+    'sql': [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000],
+    'render': [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000],
+    'size': [1024, 4096, 16384, 65536, 262144, 1048576, 4194304],
+}
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class Histogram:
+    """Counts of samples at or below each of a fixed list of bucket bounds"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):
+        """
+        Upper bound of the bucket holding the ``p``th percentile, or the
+        largest sample if that is smaller
+        """
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, n in zip([*self.bounds, self.max], self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def _view_histograms():
+    return {metric: Histogram(bounds) for metric, bounds in METRICS.items()}
+
+
+class Sample:
+    """Measurements for the request being handled"""
+
+    __slots__ = ('queries', 'sql', 'render', 'rendering')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.rendering = False
+
+    def time_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql += (time.perf_counter() - start) * 1000
+
+
+_local = threading.local()
+
+
+class PerformanceStats:
+    """Histograms of this process, published to the shared cache"""
+
+    def __init__(self, publish_interval=PUBLISH_INTERVAL):
+        self.publish_interval = publish_interval
+        self.namespace = CacheNamespace('perf-stats', timeout=SNAPSHOT_TIMEOUT)
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self._lock = threading.Lock()
+        self._views = defaultdict(_view_histograms)
+        self._version = None
+        self._last_publish = time.monotonic()
+
+    def record(self, view, **values):
+        """Add one request's ``metric=value`` measurements for ``view``"""
+        now = time.monotonic()
+        with self._lock:
+            histograms = self._views[view]
+            for metric, value in values.items():
+                if value is not None:
+                    histograms[metric].add(value)
+            due = now - self._last_publish >= self.publish_interval
+            if due:
+                self._last_publish = now
+        if due:
+            self.publish()
+
+    def publish(self):
+        """Store this process's histograms in the shared cache"""
+        version = self.namespace.version()
+        with self._lock:
+            if self._version is not None and version != self._version:
+                # Reset since the last publish: drop what was collected before
+                self._views.clear()
+            self._last_publish = time.monotonic()
+            snapshot = copy.deepcopy(dict(self._views))
+
+        # Registering again every time keeps the worker listed should its
+        # entry be lost to a concurrent update or an eviction, and keeps the
+        # set from expiring while anyone publishes
+        self.namespace.add_member('workers', self.worker, version=version)
+        self._version = version
+        self.namespace.set(f'worker:{self.worker}', snapshot, version=version)
+
+    def collect(self):
+        """Return ``{view: {metric: Histogram}}`` merged across all workers"""
+        version = self.namespace.version()
+        workers = self.namespace.members('workers', version=version)
+        snapshots = self.namespace.get_many(
+            [f'worker:{worker}' for worker in workers], version=version
+        )
+        merged = defaultdict(_view_histograms)
+        for snapshot in snapshots.values():
+            for view, histograms in snapshot.items():
+                for metric, histogram in histograms.items():
+                    if metric in merged[view]:
+                        merged[view][metric].merge(histogram)
+        return dict(merged)
+
+    def reset(self):
+        """Discard the statistics of every worker"""
+        self.namespace.invalidate()
+        with self._lock:
+            self._views.clear()
+
+
+stats = PerformanceStats()
+
+# Ways to order summary rows; the first is the default
+SORT_KEYS = {
+    'total': lambda row: row['total_ms'],
+    'requests': lambda row: row['requests'],
+    'p95': lambda row: row['latency_p95'] or 0,
+    'queries': lambda row: row['queries_mean'] or 0,
+    'size': lambda row: row['size_mean'] or 0,
+}
+
+
+def summarize(views, sort='total'):
+    """One row of headline figures per view, slowest in total first"""
+    rows = []
+    for view, h in views.items():
+        latency = h['latency']
+        if not latency.count:
+            continue
+        rows.append({
+            'view': view,
+            'requests': latency.count,
+            'total_ms': latency.total,
+            'latency_mean': latency.mean,
+            'latency_p50': latency.percentile(50),
+            'latency_p95': latency.percentile(95),
+            'latency_p99': latency.percentile(99),
+            'latency_max': latency.max,
+            'queries_mean': h['queries'].mean,
+            'queries_p95': h['queries'].percentile(95),
+            'queries_max': h['queries'].max,
+            'sql_mean': h['sql'].mean,
+            'render_mean': h['render'].mean,
+            'size_mean': h['size'].mean,
+        })
+    rows.sort(key=SORT_KEYS.get(sort, SORT_KEYS['total']), reverse=True)
+    return rows
+
+
+_original_render = django_backend.Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    sample = getattr(_local, 'sample', None)
+    if sample is None or sample.rendering:
+        return _original_render(self, context, request)
+    sample.rendering = True
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        sample.render += (time.perf_counter() - start) * 1000
+        sample.rendering = False
+
+
+def instrument_templates():
+    """Time renders of Django templates, including render_to_string()"""
+    django_backend.Template.render = _timed_render
+
+
+class PerformanceMiddleware:
+    """Record per-view latency, SQL and template statistics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        sample = _local.sample = Sample()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(sample.time_query):
+                response = self.get_response(request)
+        finally:
+            _local.sample = None
+        latency = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        method = request.method if request.method in METHODS else 'OTHER'
+        stats.record(
+            f"{method} {match.view_name if match else '<unresolved>'}",
+            latency=latency,
+            queries=sample.queries,
+            sql=sample.sql,
+            render=sample.render,
+            size=None if response.streaming else len(response.content),
+        )
+        return response
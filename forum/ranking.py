@@ -0,0 +1,85 @@
+"""
+Hot ranking of threads.
+
+A thread's hotness is its engagement (weighted likes, replies and views)
+halving every FORUM_HOT_HALF_LIFE seconds of age. Ordering by that is the
+same as ordering by
+
+    log2(1 + engagement) + (created_at - EPOCH) / HALF_LIFE
+
+which is what ``Thread.hot_score`` stores. It doesn't depend on the current
+time, so scores never need refreshing just because time passes: only when
+engagement changes. The counter UPDATEs in forum.models and forum.viewcounts
+set it in the same statement, and ``manage.py refresh_hot_scores``
+recomputes it in bulk (after changing the weights, for example).
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.functions import Ln
+from django.utils import timezone
+
+HALF_LIFE = getattr(settings, 'FORUM_HOT_HALF_LIFE', 24 * 60 * 60)
+
+# Engagement weights
+LIKE_WEIGHT = 2.0
+REPLY_WEIGHT = 1.0
+VIEW_WEIGHT = 0.05
+
+# Keeps the age term small; scores only matter relative to each other
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def hot_score(like_count, reply_count, views, created_at):
+    """The hot score of a thread with the given counters"""
+    engagement = like_count * LIKE_WEIGHT + reply_count * REPLY_WEIGHT + views * VIEW_WEIGHT
+    age = (created_at - EPOCH).total_seconds()
+    return math.log2(1 + engagement) + age / HALF_LIFE
+
+
+def initial_hot_score():
+    """Score of a thread created now, before any activity"""
+    return hot_score(0, 0, 0, timezone.now())
+
+
+class EpochSeconds(Func):
+    """Seconds from 1970-01-01 UTC to a datetime column"""
+
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)',
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='EXTRACT(EPOCH FROM %(expressions)s)::double precision',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context
+        )
+
+
+def hot_score_expression(like_count=None, reply_count=None, views=None):
+    """
+    SQL expression for ``Thread.hot_score``. Pass the new value of any
+    counter updated in the same statement, since the others read the old row.
+    """
+    engagement = (
+        (F('like_count') if like_count is None else like_count) * Value(LIKE_WEIGHT)
+        + (F('reply_count') if reply_count is None else reply_count) * Value(REPLY_WEIGHT)
+        + (F('views') if views is None else views) * Value(VIEW_WEIGHT)
+    )
+    return (
+        Ln(engagement + Value(1.0)) / Value(math.log(2))
+        + (EpochSeconds('created_at') - Value(EPOCH.timestamp())) / Value(float(HALF_LIFE))
+    )
@@ -0,0 +1,141 @@
+"""
+Markdown rendering pipeline shared by the ``markdown`` template filter and the
+pre-rendered HTML stored on threads and replies.
+
+Building a ``markdown.Markdown`` instance loads every extension (codehilite
+pulls in Pygments), so each thread keeps its own configured instance and
+``reset()``s it between documents. Sanitized output is kept in a bounded LRU
+keyed by a hash of the source text; ``cache_info()`` reports how well it is
+sized.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import markdown
+import bleach
+from django.conf import settings
+
+# Bump this whenever MARKDOWN_EXTENSIONS, ALLOWED_TAGS or ALLOWED_ATTRIBUTES
+# change, then run ``python manage.py rerender_content`` to refresh stored HTML.
+RENDERER_VERSION = 1
+
+MARKDOWN_EXTENSIONS = [
+    'markdown.extensions.fenced_code',
+    'markdown.extensions.codehilite',
+    'markdown.extensions.tables',
+    'markdown.extensions.nl2br',
+    'markdown.extensions.sane_lists',
+    'markdown.extensions.extra',
+]
+
+# Allowed HTML tags and attributes for bleach
+ALLOWED_TAGS = [
+    'p', 'br', 'strong', 'em', 'u', 's', 'code', 'pre', 'blockquote',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li', 'hr', 'a', 'img',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+    'div', 'span',
+]
+
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'target', 'rel'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'code': ['class'],
+    'pre': ['class'],
+    'div': ['class'],
+    'span': ['class'],
+}
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class MarkdownRenderer:
+    """Thread-safe markdown to sanitized HTML renderer with an LRU cache"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def _get_tools(self):
+        """Return this thread's Markdown instance and bleach Cleaner"""
+        tools = getattr(self._local, 'tools', None)
+        if tools is None:
+            tools = (
+                markdown.Markdown(extensions=MARKDOWN_EXTENSIONS),
+                bleach.Cleaner(
+                    tags=ALLOWED_TAGS,
+                    attributes=ALLOWED_ATTRIBUTES,
+                    strip=True
+                ),
+            )
+            self._local.tools = tools
+        return tools
+
+    def _convert(self, text):
+        md, cleaner = self._get_tools()
+        try:
+            html = md.convert(text)
+        finally:
+            md.reset()
+        # Sanitize HTML to prevent XSS
+        return cleaner.clean(html)
+
+    def render(self, text):
+        """Convert markdown text to sanitized HTML"""
+        if not text:
+            return ''
+
+        if self.maxsize <= 0:
+            return self._convert(text)
+
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        with self._lock:
+            html = self._cache.get(key)
+            if html is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return html
+            self._misses += 1
+
+        html = self._convert(text)
+
+        with self._lock:
+            self._cache[key] = html
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return html
+
+    def cache_info(self):
+        """Return hit/miss counters and current size of the output cache"""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, len(self._cache))
+
+    def cache_clear(self):
+        """Empty the output cache and reset its counters"""
+        with self._lock:
+            self._cache.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+renderer = MarkdownRenderer(
+    maxsize=getattr(settings, 'FORUM_MARKDOWN_CACHE_SIZE', 1024)
+)
+
+
+def render_markdown(text):
+    """
+    Convert markdown text to sanitized HTML
+    """
+    return renderer.render(text)
+
+
+def cache_info():
+    """Return ``CacheInfo`` for the shared renderer"""
+    return renderer.cache_info()
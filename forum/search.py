@@ -0,0 +1,248 @@
+"""
+Full-text search over threads and replies.
+
+On SQLite, threads and replies are indexed in FTS5 virtual tables kept in sync
+by triggers on the base tables. A query matches every term as a prefix and is
+ranked with BM25 (thread titles weigh more than bodies). Only if that finds
+nothing does the search fall back to a trigram index. The trigram index
+gathers a bounded candidate set, and fuzzy scoring runs on those candidates
+alone, so misspelled queries still find something without scanning the
+whole corpus.
+
+The virtual tables and triggers are (re)created after every ``migrate``
+because SQLite schema changes rebuild the base tables and drop their triggers.
+
+On PostgreSQL, each thread and reply stores a weighted ``search_vector`` kept
+up to date by a trigger (migration 0006). GIN indexes cover the vectors and,
+via ``gin_trgm_ops``, the raw text. Matching therefore uses indexes, and rank
+and similarity are only computed for matching rows.
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity, TrigramWordSimilarity
+)
+from django.db import connections, DatabaseError
+from django.db.models import F, Q
+
+from .models import Thread, Reply
+
+try:
+    from fuzzywuzzy import fuzz
+    HAS_FUZZY = True
+except ImportError:
+    HAS_FUZZY = False
+
+RESULT_LIMIT = 20
+CANDIDATE_LIMIT = 100
+FUZZY_THRESHOLD = 60
+MAX_TERMS = 10
+
+# (FTS table, base table, indexed columns, tokenizer, bm25 column weights)
+THREAD_INDEX = ('forum_thread_fts', 'forum_thread', ('title', 'content'),
+                'unicode61 remove_diacritics 2', (10.0, 1.0))
+THREAD_TRIGRAM_INDEX = ('forum_thread_trigram', 'forum_thread', ('title', 'content'),
+                        'trigram', (10.0, 1.0))
+REPLY_INDEX = ('forum_reply_fts', 'forum_reply', ('content',),
+               'unicode61 remove_diacritics 2', (1.0,))
+REPLY_TRIGRAM_INDEX = ('forum_reply_trigram', 'forum_reply', ('content',),
+                       'trigram', (1.0,))
+
+SQLITE_INDEXES = [THREAD_INDEX, THREAD_TRIGRAM_INDEX, REPLY_INDEX, REPLY_TRIGRAM_INDEX]
+
+
+def _index_sql(index):
+    """Return (create table, [create trigger]) statements for one FTS index"""
+    table, base, columns, tokenizer, _ = index
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{col}' for col in columns)
+    old_values = ', '.join(f'old.{col}' for col in columns)
+    insert = f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_values});"
+    delete = (f"INSERT INTO {table}({table}, rowid, {cols}) "
+              f"VALUES ('delete', old.id, {old_values});")
+
+    create_table = (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{cols}, content='{base}', content_rowid='id', tokenize='{tokenizer}')"
+    )
+    triggers = [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {base} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {base} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} ON {base} "
+        f"BEGIN {delete} {insert} END",
+    ]
+    return create_table, triggers
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+    return cursor.fetchone() is not None
+
+
+def ensure_sqlite_index(using='default', rebuild=False):
+    """
+    Create any missing FTS tables and sync triggers on an SQLite database and
+    populate newly created (or, with ``rebuild``, all) indexes.
+    Returns the names of the indexes that were (re)built.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+
+    built = []
+    with connection.cursor() as cursor:
+        if not (_table_exists(cursor, 'forum_thread') and _table_exists(cursor, 'forum_reply')):
+            return []
+
+        for index in SQLITE_INDEXES:
+            table = index[0]
+            create_table, triggers = _index_sql(index)
+            is_new = not _table_exists(cursor, table)
+            try:
+                cursor.execute(create_table)
+            except DatabaseError:
+                # The trigram tokenizer needs SQLite 3.34+; search works without it
+                continue
+            for trigger in triggers:
+                cursor.execute(trigger)
+            if is_new or rebuild:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+                built.append(table)
+    return built
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _prefix_expression(terms):
+    """Every term must match, each as a prefix"""
+    return ' '.join(f'{_quote(term)}*' for term in terms)
+
+
+def _trigram_expression(terms):
+    """Any trigram of any term may match; BM25 favours rows sharing more of them"""
+    trigrams = {
+        term[i:i + 3]
+        for term in terms
+        for i in range(len(term) - 2)
+    }
+    return ' OR '.join(_quote(trigram) for trigram in sorted(trigrams))
+
+
+def _ranked_ids(index, match, limit, using='default'):
+    """Return primary keys of non-deleted rows matching ``match``, best first"""
+    table, base, _, _, weights = index
+    sql = (
+        f"SELECT {table}.rowid FROM {table} "
+        f"JOIN {base} ON {base}.id = {table}.rowid "
+        f"WHERE {table} MATCH %s AND {base}.is_deleted = 0 "
+        f"ORDER BY bm25({table}, {', '.join(str(w) for w in weights)}) "
+        f"LIMIT %s"
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [match, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _in_order(queryset, ids):
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def _fuzzy_rerank(query, objects, score):
+    """Keep candidates scoring at least FUZZY_THRESHOLD, best first"""
+    if not HAS_FUZZY:
+        return objects[:RESULT_LIMIT]
+
+    query = query.lower()
+    results = []
+    for obj in objects:
+        obj.similarity_score = score(query, obj)
+        if obj.similarity_score >= FUZZY_THRESHOLD:
+            results.append(obj)
+    results.sort(key=lambda obj: obj.similarity_score, reverse=True)
+    return results[:RESULT_LIMIT]
+
+
+def _thread_score(query, thread):
+    # Title weighted slightly more than content
+    return max(
+        fuzz.partial_ratio(query, thread.title.lower()) * 1.2,
+        fuzz.partial_ratio(query, thread.content.lower())
+    )
+
+
+def _reply_score(query, reply):
+    return fuzz.partial_ratio(query, reply.content.lower())
+
+
+def _search(query, index, trigram_index, queryset, score):
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    ids = _ranked_ids(index, _prefix_expression(terms), RESULT_LIMIT)
+    if ids:
+        return _in_order(queryset, ids)
+
+    # Typo fallback: fuzzy-score only the best trigram candidates
+    match = _trigram_expression(terms)
+    if not match:
+        return []
+    try:
+        ids = _ranked_ids(trigram_index, match, CANDIDATE_LIMIT)
+    except DatabaseError:
+        return []
+    return _fuzzy_rerank(query, _in_order(queryset, ids), score)
+
+
+def sqlite_search(query):
+    """Search threads and replies using the SQLite FTS5 indexes"""
+    threads = _search(
+        query, THREAD_INDEX, THREAD_TRIGRAM_INDEX,
+        Thread.objects.select_related('author', 'category'),
+        _thread_score
+    )
+    replies = _search(
+        query, REPLY_INDEX, REPLY_TRIGRAM_INDEX,
+        Reply.objects.select_related('author', 'thread'),
+        _reply_score
+    )
+    return threads, replies
+
+
+# Must match the text search configuration used by the triggers in
+# migration 0006, otherwise stored vectors and queries stem differently
+SEARCH_CONFIG = 'english'
+
+
+def postgres_search(query):
+    """Search threads and replies using the stored vectors and trigram indexes"""
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+
+    threads = Thread.objects.filter(
+        Q(search_vector=search_query)
+        | Q(title__trigram_similar=query)
+        | Q(content__trigram_word_similar=query),
+        is_deleted=False
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        similarity=TrigramSimilarity('title', query) + TrigramWordSimilarity(query, 'content'),
+    ).order_by('-rank', '-similarity').select_related('author', 'category')[:RESULT_LIMIT]
+
+    replies = Reply.objects.filter(
+        Q(search_vector=search_query) | Q(content__trigram_word_similar=query),
+        is_deleted=False
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        similarity=TrigramWordSimilarity(query, 'content'),
+    ).order_by('-rank', '-similarity').select_related('author', 'thread')[:RESULT_LIMIT]
+
+    return list(threads), list(replies)
@@ -0,0 +1,166 @@
+"""
+Cache invalidation driven by model writes. Connected in ForumConfig.ready().
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .caching import home_page_cache, page_stamps, thread_counts, user_counts
+from .models import Category, Tag, Thread, Reply, ThreadLike, ReplyLike
+from courses.models import Course
+from resources.models import Resource
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Thread)
+@receiver([post_save, post_delete], sender=Reply)
+@receiver([post_save, post_delete], sender=ThreadLike)
+def invalidate_home_page(sender, **kwargs):
+    home_page_cache.invalidate()
+
+
+# Listing counts. Replies are included for the unanswered filter.
+
+@receiver([post_save, post_delete], sender=Thread)
+@receiver([post_save, post_delete], sender=Reply)
+@receiver(m2m_changed, sender=Thread.tags.through)
+def invalidate_thread_counts(sender, **kwargs):
+    thread_counts.invalidate()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_counts(sender, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        user_counts.invalidate()
+
+
+# Listing rows only cache what changes through these writes; counters, views
+# and relative times are rendered live, so replies and likes don't bump the
+# version.
+
+@receiver(post_save, sender=Thread)
+def bump_thread_version(sender, instance, created, **kwargs):
+    if not created:
+        Thread.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+
+
+@receiver(m2m_changed, sender=Thread.tags.through)
+def bump_version_on_tag_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Thread.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+    elif action in ('post_add', 'post_remove'):
+        Thread.objects.filter(pk__in=pk_set).update(version=F('version') + 1)
+    elif action == 'pre_clear':
+        # The tag's threads can't be looked up once the links are gone
+        instance.threads.update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Tag)
+def bump_tagged_thread_versions(sender, instance, created, **kwargs):
+    if not created:
+        instance.threads.update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Category)
+def bump_category_thread_versions(sender, instance, created, **kwargs):
+    if not created:
+        Thread.objects.filter(category=instance).update(version=F('version') + 1)
+
+
+# Page stamps (HTTP validators). They are touched once the write commits, so
+# a page rendered from the old data never carries the new stamp. View counts
+# are left out: they are buffered and only approximate anyway.
+
+def touch_pages(*keys):
+    transaction.on_commit(lambda: page_stamps.touch(*keys))
+
+
+def touch_thread_pages(thread_ids, category_ids=(), listings=True):
+    """Touch the threads' pages and, with ``listings``, the listings showing them"""
+    keys = [f'thread:{pk}' for pk in thread_ids]
+    if listings:
+        slugs = Category.objects.filter(
+            Q(pk__in=category_ids) | Q(threads__pk__in=thread_ids)
+        ).values_list('slug', flat=True).distinct()
+        keys += ['threads', *(f'category:{slug}' for slug in slugs)]
+    touch_pages(*keys)
+
+
+@receiver(pre_save, sender=Thread)
+def remember_thread_category(sender, instance, update_fields=None, **kwargs):
+    # A thread moved to another category drops out of the old one's listing
+    instance._previous_category_id = None
+    if instance.pk and (update_fields is None or 'category' in update_fields):
+        instance._previous_category_id = Thread.objects.filter(
+            pk=instance.pk
+        ).values_list('category_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Thread)
+def touch_thread(sender, instance, **kwargs):
+    touch_thread_pages(
+        [instance.pk],
+        [instance.category_id, getattr(instance, '_previous_category_id', None)]
+    )
+
+
+@receiver([post_save, post_delete], sender=Reply)
+@receiver([post_save, post_delete], sender=ThreadLike)
+def touch_thread_of(sender, instance, **kwargs):
+    touch_thread_pages([instance.thread_id])
+
+
+@receiver([post_save, post_delete], sender=ReplyLike)
+def touch_thread_of_reply(sender, instance, **kwargs):
+    # Reply like counts only appear on the thread page
+    thread_id = Reply.objects.filter(
+        pk=instance.reply_id
+    ).values_list('thread_id', flat=True).first()
+    if thread_id:
+        touch_thread_pages([thread_id], listings=False)
+
+
+@receiver(m2m_changed, sender=Thread.tags.through)
+@receiver(m2m_changed, sender=Thread.courses.through)
+@receiver(m2m_changed, sender=Thread.resources.through)
+def touch_on_link_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Listing rows show tags but not courses or resources
+    listings = sender is Thread.tags.through
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_thread_pages([instance.pk], listings=listings)
+    elif action in ('post_add', 'post_remove'):
+        touch_thread_pages(list(pk_set), listings=listings)
+    elif action == 'pre_clear':
+        touch_thread_pages(
+            list(instance.threads.values_list('pk', flat=True)), listings=listings
+        )
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Tag)
+def touch_taxonomy(sender, **kwargs):
+    # Category and tag names and lists appear on every page
+    touch_pages('taxonomy')
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Resource)
+def touch_linked_names(sender, created=False, **kwargs):
+    # A new course or resource isn't linked to any thread yet
+    if not created:
+        touch_pages('taxonomy')
+
+
+@receiver([post_save, post_delete], sender=User)
+def touch_users(sender, created=False, update_fields=None, **kwargs):
+    # Names, avatars and roles; logging in only writes last_login
+    if created:
+        return
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        touch_pages('users')
@@ -1,3 +1,1083 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import performance, viewcounts
+from .datagen import ForumDataGenerator
+from .management.commands.recount_forum import user_stats_updates
+from .caching import (
+    CacheNamespace, SlidingWindowLimiter, thread_counts, thread_row_cache, user_counts,
+)
+from .models import (
+    Category, Tag, Thread, Reply, ThreadLike, ReplyLike, Notification, Report,
+    ModerationAction, PendingViewCount, UserStats
+)
+from .notifications import (
+    deliver_pending, send_reply_notification, send_mention_notifications
+)
+from .pagination import encode_cursor
+from .ranking import hot_score
+from .rendering import RENDERER_VERSION, MarkdownRenderer
+
+User = get_user_model()
+
+
+# A process-local cache keeps cache traffic out of the query counts
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+})
+class ForumTestCase(TestCase):
+    """Shared fixtures for forum view tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@pilani.bits-pilani.ac.in', password='pass12345'
+        )
+        cls.replier = User.objects.create_user(
+            username='replier', email='replier@pilani.bits-pilani.ac.in', password='pass12345'
+        )
+        cls.category = Category.objects.create(name='General Discussion')
+        cls.tag = Tag.objects.create(name='doubt')
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        # Hand buffered page views to the test database rather than leaving
+        # them for the exit hook, which runs after it is gone
+        viewcounts.buffer.spill()
+
+    def create_thread(self, title='A thread about exams', replies=0):
+        thread = Thread.objects.create(
+            title=title,
+            content='Thread content that is long enough.',
+            author=self.author,
+            category=self.category,
+        )
+        thread.tags.add(self.tag)
+        for i in range(replies):
+            Reply.objects.create(
+                thread=thread,
+                author=self.replier if i % 2 else self.author,
+                content=f'Reply number {i} with some text.',
+            )
+        return thread
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+class RenderedContentTests(ForumTestCase):
+
+    def test_pages_serve_the_stored_html(self):
+        thread = self.create_thread()
+        reply = Reply.objects.create(thread=thread, author=self.replier, content='Some **bold** text')
+        stored = Reply.objects.values('content_html', 'content_html_version').get(pk=reply.pk)
+        self.assertIn('<strong>bold</strong>', stored['content_html'])
+        self.assertEqual(stored['content_html_version'], RENDERER_VERSION)
+
+        with mock.patch('forum.models.render_markdown') as render:
+            response = self.client.get(reverse('forum:thread_detail', args=[thread.pk]))
+        self.assertContains(response, '<strong>bold</strong>')
+        render.assert_not_called()
+
+    def test_edits_and_stale_versions_are_rerendered(self):
+        thread = self.create_thread()
+        reply = Reply.objects.create(thread=thread, author=self.replier, content='Some **bold** text')
+
+        self.client.force_login(self.replier)
+        self.client.post(reverse('forum:edit_reply', args=[reply.pk]), {'content': 'Now *emphasis*'})
+        reply.refresh_from_db()
+        self.assertIn('<em>emphasis</em>', reply.content_html)
+        self.assertNotIn('bold', reply.content_html)
+
+        # Saving other columns leaves the stored HTML alone
+        Reply.objects.filter(pk=reply.pk).update(content_html='<p>kept</p>')
+        reply.refresh_from_db()
+        reply.save(update_fields=['edited_at'])
+        reply.refresh_from_db()
+        self.assertEqual(reply.content_html, '<p>kept</p>')
+
+        # HTML from an older renderer is redone when read
+        Reply.objects.filter(pk=reply.pk).update(content_html_version=RENDERER_VERSION - 1)
+        reply.refresh_from_db()
+        self.assertIn('<em>emphasis</em>', reply.get_content_html())
+        self.assertEqual(reply.content_html_version, RENDERER_VERSION)
+
+
+class MarkdownRendererTests(TestCase):
+
+    def test_lru_hits_misses_and_eviction(self):
+        renderer = MarkdownRenderer(maxsize=2)
+        html = renderer.render('**one**')
+        self.assertEqual(renderer.render('**one**'), html)
+        self.assertEqual(tuple(renderer.cache_info()), (1, 1, 2, 1))
+
+        renderer.render('two')
+        renderer.render('**one**')  # Now the most recently used
+        renderer.render('three')    # Evicts 'two'
+        self.assertEqual(tuple(renderer.cache_info()), (2, 3, 2, 2))
+        renderer.render('**one**')
+        renderer.render('two')
+        self.assertEqual(tuple(renderer.cache_info()), (3, 4, 2, 2))
+
+        renderer.cache_clear()
+        self.assertEqual(tuple(renderer.cache_info()), (0, 0, 2, 0))
+
+    def test_disabled_cache_and_empty_text(self):
+        renderer = MarkdownRenderer(maxsize=0)
+        self.assertIn('<strong>one</strong>', renderer.render('**one**'))
+        self.assertEqual(renderer.render(''), '')
+        self.assertEqual(tuple(renderer.cache_info()), (0, 0, 0, 0))
+
+
+class CounterTests(ForumTestCase):
+
+    def test_reply_count_follows_creates_and_soft_deletes(self):
+        thread = self.create_thread(replies=2)
+        first, last = thread.replies.order_by('created_at', 'pk')
+        thread.refresh_from_db()
+        self.assertEqual(thread.reply_count, 2)
+        self.assertEqual(thread.last_reply, last)
+
+        # A full save of a stale copy doesn't write the counters back
+        stale = Thread.objects.get(pk=thread.pk)
+        Reply.objects.create(thread=thread, author=self.author, content='A third reply.')
+        stale.save()
+        thread.refresh_from_db()
+        self.assertEqual(thread.reply_count, 3)
+
+        last.soft_delete()
+        last.soft_delete()
+        thread.refresh_from_db()
+        self.assertEqual(thread.reply_count, 2)
+        self.assertEqual(thread.reply_count, thread.replies.filter(is_deleted=False).count())
+
+    def toggle(self, url):
+        return self.client.post(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+
+    def test_like_counts_follow_toggles(self):
+        thread = self.create_thread(replies=1)
+        reply = thread.replies.get()
+        thread_like = reverse('forum:toggle_thread_like', args=[thread.pk])
+        reply_like = reverse('forum:toggle_reply_like', args=[reply.pk])
+
+        self.client.force_login(self.replier)
+        self.assertEqual(self.toggle(thread_like), {'liked': True, 'like_count': 1})
+        self.assertEqual(self.toggle(reply_like), {'liked': True, 'like_count': 1})
+        self.client.force_login(self.author)
+        self.client.post(thread_like)
+        thread.refresh_from_db()
+        self.assertEqual(thread.like_count, 2)
+
+        self.assertEqual(self.toggle(thread_like), {'liked': False, 'like_count': 1})
+        self.client.force_login(self.replier)
+        self.assertEqual(self.toggle(reply_like), {'liked': False, 'like_count': 0})
+        self.assertEqual(thread.likes.count(), 1)
+
+
+class CategoryDetailQueryTests(ForumTestCase):
+
+    def test_query_count_independent_of_threads_per_page(self):
+        url = reverse('forum:category_detail', args=[self.category.slug])
+
+        self.create_thread(replies=3)
+        baseline = self.count_queries(url)
+
+        for i in range(9):
+            self.create_thread(title=f'Another thread {i}', replies=i)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_shows_latest_reply_author(self):
+        thread = self.create_thread(replies=2)
+        response = self.client.get(reverse('forum:category_detail', args=[self.category.slug]))
+        self.assertEqual(thread.replies.latest('created_at').author, self.replier)
+        self.assertContains(response, f'Last reply by {self.replier.get_display_name()}')
+
+
+class ForumHomeCacheTests(ForumTestCase):
+
+    def test_shared_data_cached_until_a_write(self):
+        url = reverse('forum:home')
+        self.create_thread(title='First thread')
+        cold = self.count_queries(url)
+        warm = self.count_queries(url)
+        self.assertLess(warm, cold)
+
+        thread = self.create_thread(title='Second thread')
+        response = self.client.get(url)
+        self.assertIn(thread, response.context['recent_threads'])
+
+
+class ThreadRowCacheTests(ForumTestCase):
+
+    def test_rows_served_from_cache_until_thread_changes(self):
+        thread = self.create_thread(title='Original title')
+        url = reverse('forum:all_threads')
+        thread_row_cache.reset_stats()
+
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(thread_row_cache.stats()['hits'], 1)
+
+        thread.title = 'Edited title'
+        thread.save()
+        self.assertContains(self.client.get(url), 'Edited title')
+
+        other = Tag.objects.create(name='compre')
+        thread.tags.add(other)
+        self.assertContains(self.client.get(url), 'compre')
+
+        other.name = 'endsem'
+        other.save()
+        self.assertContains(self.client.get(url), 'endsem')
+
+    def test_admin_actions_expire_cached_rows(self):
+        thread = self.create_thread()
+        url = reverse('forum:all_threads')
+        self.assertNotContains(self.client.get(url), 'bi-lock-fill')
+
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@pilani.bits-pilani.ac.in', password='pass12345'
+        )
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:forum_thread_changelist'), {
+            'action': 'lock_threads', '_selected_action': [thread.pk],
+        })
+        self.assertContains(self.client.get(url), 'bi-lock-fill')
+
+
+class ThreadListingPaginationTests(ForumTestCase):
+
+    def test_cursor_pages_cover_every_thread_once(self):
+        threads = [self.create_thread(title=f'Thread number {i}') for i in range(25)]
+        url = reverse('forum:all_threads')
+
+        first = self.client.get(url).context['threads']
+        self.assertEqual(len(first), 20)
+        self.assertTrue(first.has_next)
+
+        second = self.client.get(url, {'after': first.next_cursor}).context['threads']
+        self.assertFalse(second.has_next)
+        seen = [thread.pk for thread in [*first, *second]]
+        self.assertEqual(seen, [thread.pk for thread in reversed(threads)])
+
+    def test_json_fragment_for_infinite_scroll(self):
+        for i in range(12):
+            self.create_thread(title=f'Thread number {i}')
+        url = reverse('forum:category_detail', args=[self.category.slug])
+        cursor = self.client.get(url).context['threads'].next_cursor
+
+        data = self.client.get(url, {'after': cursor, 'format': 'json'}).json()
+        self.assertRegex(data['html'], r'Thread number 1\s')
+        self.assertNotRegex(data['html'], r'Thread number 11\s')
+        self.assertFalse(data['has_next'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_deep_page_costs_the_same_queries_as_the_first(self):
+        for i in range(25):
+            self.create_thread(title=f'Thread number {i}')
+        url = reverse('forum:all_threads')
+        cursor = self.client.get(url).context['threads'].next_cursor
+        deep = f'{url}?after={cursor}'
+        self.client.get(deep)  # fills the row cache, as the first request did for page one
+        self.assertEqual(self.count_queries(deep), self.count_queries(url))
+
+
+class ReplyPaginationTests(ForumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.thread = self.create_thread(replies=25)
+        self.url = reverse('forum:thread_detail', args=[self.thread.pk])
+        self.replies = list(self.thread.replies.order_by('created_at', 'id'))
+
+    def test_tampered_cursors_are_rejected(self):
+        listings = [
+            reverse('forum:all_threads'),
+            reverse('forum:category_detail', args=[self.category.slug]),
+            reverse('forum:trending_threads'),
+        ]
+        for values in (['notadate', 1], [{'a': 1}, 1], [self.thread.created_at.isoformat(), 'abc'],
+                       [None, 1], ['2026-01-01T00:00:00', 1e400], [1], 'not a list'):
+            cursor = encode_cursor(values)
+            with self.subTest(values=values):
+                # Pages fall back to their first page, load-more refuses
+                response = self.client.get(self.url, {'after': cursor})
+                self.assertEqual(len(response.context['replies']), 20)
+                for url in listings:
+                    self.assertEqual(self.client.get(url, {'after': cursor}).status_code, 200)
+                response = self.client.get(
+                    reverse('forum:thread_replies', args=[self.thread.pk]), {'after': cursor}
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'after': '%%%'}).status_code, 200)
+
+    def test_load_more_json(self):
+        cursor = self.client.get(self.url).context['replies'].next_cursor
+        data = self.client.get(
+            reverse('forum:thread_replies', args=[self.thread.pk]),
+            {'after': cursor, 'format': 'json'}
+        ).json()
+        self.assertIn(f'id="reply-{self.replies[20].pk}"', data['html'])
+        self.assertNotIn(f'id="reply-{self.replies[19].pk}"', data['html'])
+        self.assertFalse(data['has_next'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_permalink_redirects_to_the_page_with_the_reply(self):
+        first, late = self.replies[0], self.replies[22]
+        response = self.client.get(reverse('forum:reply_permalink', args=[first.pk]))
+        self.assertRedirects(response, f'{self.url}#reply-{first.pk}', fetch_redirect_response=False)
+
+        response = self.client.get(reverse('forum:reply_permalink', args=[late.pk]), follow=True)
+        self.assertIn(late, list(response.context['replies']))
+        self.assertTrue(response.redirect_chain[0][0].endswith(f'#reply-{late.pk}'))
+
+    def test_solution_pinned_above_the_first_page(self):
+        solution = self.replies[-1]
+        solution.mark_as_solution()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['solution'], solution)
+        self.assertNotIn(solution, list(response.context['replies']))
+        content = response.content.decode()
+        self.assertLess(
+            content.index(f'id="reply-{solution.pk}"'),
+            content.index(f'id="reply-{self.replies[0].pk}"')
+        )
+
+        # Its permalink goes to the first page, where it is pinned
+        response = self.client.get(reverse('forum:reply_permalink', args=[solution.pk]))
+        self.assertRedirects(response, f'{self.url}#reply-{solution.pk}', fetch_redirect_response=False)
+
+
+class ListingCountTests(ForumTestCase):
+
+    def test_count_cached_until_a_thread_is_written(self):
+        self.create_thread()
+        url = reverse('forum:all_threads')
+        self.assertEqual(self.client.get(url).context['thread_count'], (1, False))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+        self.create_thread(title='Another thread')
+        self.assertEqual(self.client.get(url).context['thread_count'], (2, False))
+        response = self.client.get(url, {'tag': self.tag.slug, 'sort': 'unanswered'})
+        self.assertEqual(response.context['thread_count'], (2, False))
+
+    def test_large_counts_use_planner_estimate(self):
+        self.create_thread()
+        url = reverse('forum:category_detail', args=[self.category.slug])
+        with mock.patch('forum.pagination.planner_estimate', return_value=123_456):
+            response = self.client.get(url)
+        self.assertEqual(response.context['thread_count'], (123_456, True))
+        self.assertContains(response, '(about 123456)')
+
+    def test_manage_users_counts_without_annotations(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@pilani.bits-pilani.ac.in', password='pass12345'
+        )
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('forum:manage_users'), {'role': 'regular'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+        counts = [q['sql'] for q in queries if 'COUNT(*)' in q['sql']]
+        self.assertTrue(counts)
+        self.assertFalse([sql for sql in counts if 'forum_thread' in sql])
+
+    def test_pages_past_an_estimate_clamp_to_the_last_page(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@pilani.bits-pilani.ac.in', password='pass12345'
+        )
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@pilani.bits-pilani.ac.in')
+            for i in range(20)
+        ])
+        self.client.force_login(admin)
+        url = reverse('forum:manage_users')
+        with mock.patch('forum.pagination.planner_estimate', return_value=123_456):
+            response = self.client.get(url)
+            self.assertContains(response, 'Page 1 of about 6173')
+            self.assertNotContains(response, '>Last<')
+
+            response = self.client.get(url, {'page': 5})
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 2)
+        self.assertEqual(len(page), 3)
+        self.assertFalse(page.paginator.count_is_estimate)
+        self.assertContains(response, 'Page 2 of 2')
+
+
+class ManageUsersTests(ForumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@pilani.bits-pilani.ac.in', password='pass12345'
+        )
+        self.client.force_login(self.admin)
+        self.url = reverse('forum:manage_users')
+
+    def test_header_stats_in_one_cached_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['total_users'], 3)
+        self.assertEqual(response.context['total_admins'], 1)
+        self.assertEqual(response.context['total_regular'], 2)
+        self.assertEqual(len([q for q in queries if 'total_admins' in q['sql']]), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([q for q in queries if 'total_admins' in q['sql']])
+
+    def test_search_and_sort(self):
+        User.objects.filter(pk=self.replier.pk).update(full_name='Zoe Replier')
+        response = self.client.get(self.url, {'search': 'REPL', 'sort': 'full_name'})
+        self.assertEqual(list(response.context['users']), [self.replier])
+
+        # Substrings match too: a last name, the middle of a username, a domain
+        User.objects.filter(pk=self.author.pk).update(full_name='Asha Verma')
+        response = self.client.get(self.url, {'search': 'verma'})
+        self.assertEqual(list(response.context['users']), [self.author])
+        response = self.client.get(self.url, {'search': 'plie'})
+        self.assertEqual(list(response.context['users']), [self.replier])
+        response = self.client.get(self.url, {'search': 'pilani'})
+        self.assertEqual(len(response.context['users']), 3)
+
+        # Sort keys outside the whitelist fall back to the default
+        response = self.client.get(self.url, {'sort': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['users'])[0], self.admin)
+
+
+class ModerationQueueTests(ForumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.moderator = User.objects.create_user(
+            username='moderator', email='moderator@pilani.bits-pilani.ac.in',
+            password='pass12345', is_moderator=True
+        )
+        self.client.force_login(self.moderator)
+        self.url = reverse('forum:moderation_queue')
+
+    def report(self, reason=Report.ReportReason.SPAM, **content):
+        return Report.objects.create(
+            reporter=self.replier, reason=reason, description='Please look at this.', **content
+        )
+
+    def test_reports_grouped_by_content(self):
+        thread = self.create_thread(replies=1)
+        reply = thread.replies.get()
+        for _ in range(3):
+            self.report(thread=thread)
+        self.report(thread=thread, reason=Report.ReportReason.OFFTOPIC)
+        self.report(reply=reply)
+        self.report(reply=reply, reason=Report.ReportReason.OTHER).dismiss(self.moderator)
+
+        response = self.client.get(self.url)
+        entries = {entry['target']: entry for entry in response.context['entries']}
+        self.assertEqual(entries[f'thread:{thread.pk}']['report_count'], 4)
+        self.assertEqual(
+            entries[f'thread:{thread.pk}']['reasons'],
+            [('Spam or Advertisement', 3), ('Off-topic', 1)]
+        )
+        self.assertEqual(entries[f'reply:{reply.pk}']['report_count'], 1)
+        counts = {item['status']: item['count'] for item in response.context['status_counts']}
+        self.assertEqual(counts, {'PENDING': 5, 'REVIEWED': 0, 'RESOLVED': 0, 'DISMISSED': 1})
+
+        response = self.client.get(self.url, {'sort': 'most_reported'})
+        self.assertEqual(response.context['entries'][0]['thread'], thread)
+
+    def test_query_count_independent_of_queue_size(self):
+        thread = self.create_thread(replies=3)
+        replies = list(thread.replies.all())
+        self.report(thread=thread)
+        self.report(reply=replies[0])
+        baseline = self.count_queries(self.url)
+
+        for reply in replies:
+            self.report(reply=reply)
+            self.report(reply=reply, reason=Report.ReportReason.HARASSMENT)
+        self.report(thread=self.create_thread(title='Another reported thread'))
+        self.assertEqual(self.count_queries(self.url), baseline)
+
+    def test_bulk_close_in_one_update(self):
+        thread = self.create_thread(replies=1)
+        reply = thread.replies.get()
+        reports = [self.report(thread=thread), self.report(thread=thread), self.report(reply=reply)]
+        other = self.report(thread=self.create_thread(title='Left alone'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('forum:handle_reports'), {
+                'action': 'dismiss',
+                'targets': [f'thread:{thread.pk}', f'reply:{reply.pk}', 'bogus', 'thread:x'],
+                'notes': 'Not a problem',
+            })
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertRedirects(response, self.url)
+
+        action = ModerationAction.objects.get()
+        self.assertEqual(action.moderator, self.moderator)
+        self.assertEqual(action.reports.count(), 3)
+        for report in reports:
+            report.refresh_from_db()
+            self.assertEqual(report.status, Report.ReportStatus.DISMISSED)
+            self.assertEqual(report.moderator_notes, 'Not a problem')
+        other.refresh_from_db()
+        self.assertEqual(other.status, Report.ReportStatus.PENDING)
+
+        # Nothing left open: no audit record
+        self.client.post(reverse('forum:handle_reports'), {
+            'action': 'resolve', 'targets': [f'thread:{thread.pk}'],
+        })
+        self.assertEqual(ModerationAction.objects.count(), 1)
+
+    def test_delete_content_resolves_its_reports(self):
+        thread = self.create_thread()
+        report = self.report(thread=thread)
+        self.client.post(reverse('forum:handle_reports'), {
+            'action': 'delete_content', 'targets': [f'thread:{thread.pk}'],
+        })
+        thread.refresh_from_db()
+        report.refresh_from_db()
+        self.assertTrue(thread.is_deleted)
+        self.assertEqual(report.status, Report.ReportStatus.RESOLVED)
+
+    def test_report_content_records_reporter(self):
+        thread = self.create_thread()
+        self.client.force_login(self.replier)
+        self.client.post(reverse('forum:report_content'), {
+            'reason': Report.ReportReason.SPAM, 'description': 'Advertising a paid notes service.',
+            'content_type': 'thread', 'content_id': thread.pk,
+        })
+        self.assertEqual(Report.objects.get().reporter, self.replier)
+
+
+class ViewCountTests(ForumTestCase):
+
+    def test_repeat_views_by_one_viewer_count_once(self):
+        thread = self.create_thread()
+        url = reverse('forum:thread_detail', args=[thread.pk])
+        self.client.force_login(self.replier)
+        self.client.get(url)
+        self.client.get(url)
+        self.client.force_login(self.author)  # a new session
+        self.client.get(url)
+
+        viewcounts.flush()
+        thread.refresh_from_db()
+        self.assertEqual(thread.views, 2)
+
+    def test_spills_accumulate_and_drain_once(self):
+        thread = self.create_thread()
+        key = (thread._meta.label_lower, thread.pk)
+        viewcounts.spill({key: 2})
+        viewcounts.spill({key: 3})  # another worker
+
+        self.assertEqual(viewcounts.drain(), 1)
+        self.assertEqual(viewcounts.drain(), 0)
+        thread.refresh_from_db()
+        self.assertEqual(thread.views, 5)
+        self.assertFalse(PendingViewCount.objects.exists())
+
+    def test_drain_in_batches(self):
+        threads = [self.create_thread(title=f'Thread {i}') for i in range(3)]
+        viewcounts.spill({(thread._meta.label_lower, thread.pk): 1 for thread in threads})
+
+        self.assertEqual(viewcounts.drain(batch_size=2, max_batches=1), 2)
+        self.assertEqual(PendingViewCount.objects.count(), 1)
+        self.assertEqual(viewcounts.drain(batch_size=2), 1)
+
+    def test_flush_errors_do_not_fail_the_page(self):
+        thread = self.create_thread()
+        url = reverse('forum:thread_detail', args=[thread.pk])
+
+        with mock.patch.object(viewcounts.buffer, 'flush_interval', 0):
+            with self.assertLogs('forum.viewcounts', 'ERROR'):
+                with mock.patch('forum.viewcounts.spill', side_effect=DatabaseError):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+            self.client.force_login(self.replier)
+            with self.assertLogs('forum.viewcounts', 'ERROR'):
+                with mock.patch('forum.viewcounts.drain', side_effect=DatabaseError) as drain:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+            # A page view drains one batch at most
+            drain.assert_called_once_with(max_batches=1)
+
+        viewcounts.flush()
+        thread.refresh_from_db()
+        self.assertEqual(thread.views, 2)
+
+    def test_failed_drain_keeps_the_counts(self):
+        thread = self.create_thread()
+        viewcounts.spill({(thread._meta.label_lower, thread.pk): 4})
+
+        with mock.patch.object(Thread, 'view_count_updates', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                viewcounts.drain()
+        thread.refresh_from_db()
+        self.assertEqual(thread.views, 0)
+
+        viewcounts.drain()
+        thread.refresh_from_db()
+        self.assertEqual(thread.views, 4)
+
+
+class ConditionalGetTests(ForumTestCase):
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_answer_304(self):
+        thread = self.create_thread()
+        self.client.force_login(self.replier)
+        url = reverse('forum:thread_detail', args=[thread.pk])
+        listing = reverse('forum:category_detail', args=[self.category.slug])
+
+        self.client.get(url)  # sets the CSRF cookie, which the validators include
+        response = self.client.get(url)
+        listing_response = self.client.get(listing)
+        with self.assertNumQueries(2):  # session and user
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(self.revalidate(listing, listing_response).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reply.objects.create(thread=thread, author=self.author, content='A new reply here.')
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+        self.assertEqual(self.revalidate(listing, listing_response).status_code, 200)
+
+        # Validators are per viewer
+        self.client.force_login(self.author)
+        self.assertEqual(self.revalidate(url, self.client.get(url)).status_code, 304)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_admin_actions_change_the_validators(self):
+        thread = self.create_thread()
+        self.client.force_login(self.replier)
+        url = reverse('forum:thread_detail', args=[thread.pk])
+        listing = reverse('forum:all_threads')
+        self.client.get(url)
+        response = self.client.get(url)
+        listing_response = self.client.get(listing)
+
+        admin = Client()
+        admin.force_login(User.objects.create_superuser(
+            username='admin', email='admin@pilani.bits-pilani.ac.in', password='pass12345'
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.post(reverse('admin:forum_thread_changelist'), {
+                'action': 'pin_threads', '_selected_action': [thread.pk],
+            })
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+        self.assertEqual(self.revalidate(listing, listing_response).status_code, 200)
+
+
+class ThreadDetailQueryTests(ForumTestCase):
+
+    def like_replies(self, thread, user):
+        for reply in thread.replies.all()[::2]:
+            ReplyLike.objects.create(user=user, reply=reply)
+
+    def test_query_count_independent_of_reply_count(self):
+        self.client.force_login(self.replier)
+
+        small = self.create_thread(replies=2)
+        self.like_replies(small, self.replier)
+        baseline = self.count_queries(reverse('forum:thread_detail', args=[small.pk]))
+
+        large = self.create_thread(title='A busier thread', replies=15)
+        self.like_replies(large, self.replier)
+        self.assertEqual(
+            self.count_queries(reverse('forum:thread_detail', args=[large.pk])),
+            baseline
+        )
+
+    def test_reply_like_counts_and_liked_by_viewer(self):
+        thread = self.create_thread(replies=2)
+        liked, other = thread.replies.order_by('created_at')
+        ReplyLike.objects.create(user=self.replier, reply=liked)
+        ReplyLike.objects.create(user=self.author, reply=liked)
+
+        self.client.force_login(self.replier)
+        response = self.client.get(reverse('forum:thread_detail', args=[thread.pk]))
+
+        replies = {reply.pk: reply for reply in response.context['replies']}
+        self.assertEqual(replies[liked.pk].like_count, 2)
+        self.assertTrue(replies[liked.pk].user_liked)
+        self.assertEqual(replies[other.pk].like_count, 0)
+        self.assertFalse(replies[other.pk].user_liked)
+
+
+class SQLiteSearchTests(ForumTestCase):
+
+    def search(self, query):
+        response = self.client.get(reverse('forum:search'), {'q': query})
+        return response.context['threads'], response.context['replies']
+
+    def test_prefix_typo_and_index_sync(self):
+        thread = self.create_thread(title='Midsem examination schedule', replies=1)
+
+        threads, replies = self.search('midsem exam')
+        self.assertEqual(threads, [thread])
+        self.assertEqual(len(replies), 0)
+        self.assertEqual(self.search('examinaton')[0], [thread])
+
+        thread.title = 'Compre schedule'
+        thread.save()
+        self.assertEqual(self.search('midsem')[0], [])
+        self.assertEqual(self.search('compre')[0], [thread])
+
+        thread.is_deleted = True
+        thread.save(update_fields=['is_deleted'])
+        self.assertEqual(self.search('compre')[0], [])
+
+
+class NotificationQueueTests(ForumTestCase):
+
+    def test_reply_is_queued_then_delivered(self):
+        thread = self.create_thread()
+        self.client.force_login(self.replier)
+        self.client.post(
+            reverse('forum:create_reply', args=[thread.pk]),
+            {'content': 'A reply that should notify the author.'}
+        )
+
+        self.assertEqual(len(mail.outbox), 0)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.author)
+
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.author.email])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.SENT)
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_digest_groups_notifications_per_recipient(self):
+        self.author.notification_frequency = User.NotificationFrequency.HOURLY
+        self.author.save()
+        thread = self.create_thread()
+        for i in range(3):
+            Reply.objects.create(thread=thread, author=self.replier, content=f'Digest reply {i}')
+            send_reply_notification(Reply.objects.latest('pk'))
+
+        # Nothing is due before the next hour
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (3, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('3 new notifications', mail.outbox[0].subject)
+        self.assertIn('Digest reply 2', mail.outbox[0].body)
+
+    def test_digest_not_split_between_batches(self):
+        self.author.notification_frequency = User.NotificationFrequency.HOURLY
+        self.author.save()
+        thread = self.create_thread()
+        for i in range(3):
+            Reply.objects.create(thread=thread, author=self.replier, content=f'Digest reply {i}')
+            send_reply_notification(Reply.objects.latest('pk'))
+        other = Thread.objects.create(
+            title='A thread by the replier', content='Thread content that is long enough.',
+            author=self.replier, category=self.category
+        )
+        send_reply_notification(Reply.objects.create(thread=other, author=self.author, content='Hi'))
+
+        # The author's digest straddles the batch size and its rows fall
+        # due at different times, the last after the replier's
+        now = timezone.now()
+        digest = list(Notification.objects.filter(recipient=self.author).order_by('pk'))
+        for minutes, notification in zip([3, 2, 0], digest):
+            notification.next_attempt_at = now - timezone.timedelta(minutes=minutes)
+        Notification.objects.bulk_update(digest, ['next_attempt_at'])
+        Notification.objects.filter(recipient=self.replier).update(
+            next_attempt_at=now - timezone.timedelta(minutes=1)
+        )
+
+        self.assertEqual(deliver_pending(batch_size=1), (3, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('3 new notifications', mail.outbox[0].subject)
+        self.assertEqual(deliver_pending(batch_size=1), (1, 0))
+
+    def test_mentions_resolved_in_one_query(self):
+        thread = self.create_thread()
+        others = [
+            User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@pilani.bits-pilani.ac.in', password='pass12345'
+            )
+            for i in range(3)
+        ]
+        content = (
+            '@user0 @user1 and @user0 again, @user2. Not me@example.com, '
+            f'not @{self.replier.username} or @{self.author.username} or @nobody'
+        )
+        reply = Reply.objects.create(thread=thread, author=self.replier, content=content)
+
+        with self.assertNumQueries(2):
+            created = send_mention_notifications(thread, self.replier, content, reply=reply)
+        self.assertEqual({n.recipient for n in created}, set(others))
+
+        # Editing only notifies newly mentioned users
+        edited = content + ' cc @user1 @author'
+        self.assertEqual(
+            send_mention_notifications(thread, self.replier, edited, reply, previous_content=content),
+            []
+        )
+
+    def test_failed_delivery_is_retried_later(self):
+        thread = self.create_thread()
+        notification = Notification.objects.create(
+            kind=Notification.Kind.THREAD_LOCKED,
+            recipient=self.author, actor=self.replier, thread=thread
+        )
+
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('down')):
+            self.assertEqual(deliver_pending(), (0, 1))
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.PENDING)
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, notification.created_at)
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_crash_mid_batch_resends_only_unsent_notifications(self):
+        thread = self.create_thread()
+        first, second = [
+            Notification.objects.create(
+                kind=Notification.Kind.THREAD_LOCKED, recipient=recipient,
+                actor=self.replier, thread=thread
+            )
+            for recipient in (self.author, self.replier)
+        ]
+
+        class Crash(BaseException):
+            pass
+
+        sends = []
+        test_blocks = len(connection.atomic_blocks)
+
+        def send(message, *args, **kwargs):
+            # No transaction (beyond the test's own) is held while mail goes out
+            sends.append((message.to, len(connection.atomic_blocks)))
+            if len(sends) == 2:
+                raise Crash
+            return 1
+
+        with mock.patch('django.core.mail.EmailMessage.send', send):
+            with self.assertRaises(Crash):
+                deliver_pending()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, Notification.Status.SENT)
+        self.assertEqual(second.status, Notification.Status.PENDING)
+        self.assertEqual([blocks for _, blocks in sends], [test_blocks, test_blocks])
+
+        # The second is leased to the crashed worker until the claim expires
+        self.assertEqual(deliver_pending(), (0, 0))
+        Notification.objects.filter(pk=second.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual([m.to for m in mail.outbox], [[self.replier.email]])
+
+
+class PerformanceStatsTests(ForumTestCase):
+
+    def test_requests_recorded_per_view(self):
+        performance.stats.reset()
+        thread = self.create_thread(replies=2)
+        self.client.get(reverse('forum:thread_detail', args=[thread.pk]))
+
+        moderator = User.objects.create_user(
+            username='mod', email='mod@pilani.bits-pilani.ac.in', password='pass12345',
+            is_moderator=True
+        )
+        self.client.force_login(moderator)
+        response = self.client.get(reverse('forum:performance_stats'))
+        rows = {row['view']: row for row in response.context['rows']}
+        row = rows['GET forum:thread_detail']
+        self.assertEqual(row['requests'], 1)
+        self.assertGreater(row['queries_mean'], 0)
+        self.assertGreater(row['render_mean'], 0)
+
+        self.client.force_login(self.author)
+        self.assertNotEqual(self.client.get(reverse('forum:performance_stats')).status_code, 200)
+
+    def test_lost_worker_registration_is_restored(self):
+        first, second = performance.PerformanceStats(), performance.PerformanceStats()
+        first.worker, second.worker = 'host:1', 'host:2'
+        first.reset()
+        first.record('GET a', latency=10)
+        second.record('GET b', latency=20)
+        first.publish()
+        second.publish()
+        self.assertEqual(set(first.collect()), {'GET a', 'GET b'})
+
+        # A concurrent registration (or an eviction) drops the second worker
+        first.namespace.set('workers', {'host:1'})
+        second.publish()
+        self.assertEqual(set(first.collect()), {'GET a', 'GET b'})
+
+
+class UserStatsTests(ForumTestCase):
+
+    def stats(self, user):
+        return UserStats.objects.values(
+            'thread_count', 'reply_count', 'likes_received', 'solution_count'
+        ).get(user=user)
+
+    def test_incremental_stats_match_a_rebuild(self):
+        thread = self.create_thread(replies=3)
+        other = self.create_thread(title='Another thread')
+        reply = thread.replies.filter(author=self.replier).get()
+        ThreadLike.objects.create(user=self.replier, thread=thread)
+        ReplyLike.objects.create(user=self.author, reply=reply)
+        ReplyLike.objects.get(reply=reply).delete()
+        ReplyLike.objects.create(user=self.author, reply=reply)
+        reply.mark_as_solution()
+        thread.replies.exclude(pk=reply.pk).first().mark_as_solution()
+        reply.mark_as_solution()
+        thread.replies.filter(author=self.author).first().soft_delete()
+        other.soft_delete()
+
+        incremental = {user.pk: self.stats(user) for user in (self.author, self.replier)}
+        self.assertEqual(incremental[self.author.pk], {
+            'thread_count': 1, 'reply_count': 1, 'likes_received': 1, 'solution_count': 0
+        })
+        UserStats.objects.update(**user_stats_updates())
+        for user in (self.author, self.replier):
+            self.assertEqual(self.stats(user), incremental[user.pk])
+
+    def test_home_page_reads_stored_stats(self):
+        self.create_thread(replies=2)
+        self.client.get(reverse('forum:home'))  # caches the shared data
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('forum:home'))
+        self.assertEqual(response.context['user_stats'].reply_count, 1)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+
+class HotScoreTests(ForumTestCase):
+
+    def assertScoreCurrent(self, thread):
+        thread.refresh_from_db()
+        expected = hot_score(thread.like_count, thread.reply_count, thread.views, thread.created_at)
+        self.assertAlmostEqual(thread.hot_score, expected, places=6)
+
+    def test_score_follows_activity(self):
+        thread = self.create_thread()
+        self.assertScoreCurrent(thread)
+        before = thread.hot_score
+
+        ThreadLike.objects.create(user=self.replier, thread=thread)
+        Reply.objects.create(thread=thread, author=self.replier, content='A reply with text.')
+        self.assertScoreCurrent(thread)
+
+        viewcounts.increment(thread)
+        viewcounts.buffer.spill()
+        viewcounts.drain()
+        self.assertScoreCurrent(thread)
+        self.assertGreater(thread.hot_score, before)
+
+        ThreadLike.objects.get(thread=thread).delete()
+        self.assertScoreCurrent(thread)
+
+    def test_trending_lists_this_weeks_threads_hottest_first(self):
+        quiet = self.create_thread(title='Quiet thread')
+        busy = self.create_thread(title='Busy thread')
+        ThreadLike.objects.create(user=self.replier, thread=busy)
+        old = self.create_thread(title='Old thread')
+        Thread.objects.filter(pk=old.pk).update(
+            last_activity=timezone.now() - timezone.timedelta(days=8)
+        )
+
+        response = self.client.get(reverse('forum:trending_threads'))
+        self.assertEqual(list(response.context['threads']), [busy, quiet])
+        home = self.client.get(reverse('forum:home'))
+        self.assertEqual(home.context['trending_threads'], [busy, quiet])
+
+
+class DataGeneratorTests(TestCase):
+
+    def test_generated_counters_match_rows(self):
+        counts = ForumDataGenerator(
+            users=10, categories=2, threads_per_category=10, replies_per_thread=5,
+            tags=5, courses=2, reports=5, batch_size=7
+        ).run()
+        self.assertEqual(Thread.objects.count(), counts['threads'])
+        self.assertEqual(Reply.objects.count(), counts['replies'])
+        for thread in Thread.objects.all():
+            self.assertEqual(thread.reply_count, thread.replies.count())
+            self.assertEqual(thread.like_count, thread.likes.count())
+            if thread.reply_count:
+                latest = thread.replies.latest('created_at')
+                self.assertEqual(thread.last_reply_id, latest.pk)
+                self.assertEqual(thread.last_activity, latest.created_at)
+
+    def test_rejects_bad_options_before_writing(self):
+        for options in [{'users': 0}, {'users': -1}, {'reply_alpha': 1}]:
+            with self.assertRaises(ValueError):
+                ForumDataGenerator(**options)
+        with self.assertRaisesMessage(CommandError, 'users must be at least 1'):
+            call_command('generate_forum_data', users=0)
+        self.assertFalse(Category.objects.exists())
+
+    def test_same_seed_and_now_reproduce_the_data(self):
+        now = timezone.now() - timezone.timedelta(days=30)
+        options = dict(
+            users=10, categories=2, threads_per_category=10, replies_per_thread=5,
+            tags=5, courses=2, reports=5, seed=3, now=now
+        )
+
+        def snapshot():
+            return list(Thread.objects.order_by('created_at', 'title').values_list(
+                'title', 'created_at', 'last_activity', 'reply_count', 'like_count', 'hot_score'
+            ))
+
+        ForumDataGenerator(**options).run()
+        first = snapshot()
+        Thread.objects.all().delete()
+
+        versions = thread_counts.version(), user_counts.version()
+        ForumDataGenerator(**options).run()
+        self.assertEqual(snapshot(), first)
+        self.assertTrue(all(created <= now for _, created, *rest in first))
+        # Cached counts from before the run are stale
+        self.assertNotEqual(thread_counts.version(), versions[0])
+        self.assertNotEqual(user_counts.version(), versions[1])
+
+
+class CachingTests(TestCase):
+
+    def test_namespace_invalidation(self):
+        namespace = CacheNamespace('test-pages')
+        namespace.set('home', 'cached')
+        self.assertEqual(namespace.get('home'), 'cached')
+
+        namespace.invalidate()
+        self.assertIsNone(namespace.get('home'))
+
+    def test_sliding_window_limiter(self):
+        limiter = SlidingWindowLimiter('3/h')
+        with mock.patch('forum.caching.time') as clock:
+            clock.time.return_value = 7200.0
+            self.assertEqual([limiter.hit('alice') for _ in range(4)], [True, True, True, False])
+            self.assertTrue(limiter.hit('bob'))
+
+            # Half way into the next window, half of the previous hits still count
+            clock.time.return_value = 7200.0 + 5400
+            self.assertEqual([limiter.hit('alice') for _ in range(2)], [True, False])
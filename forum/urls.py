@@ -7,6 +7,7 @@
     # Home and search
     path('', views.forum_home, name='home'),
     path('threads/', views.all_threads, name='all_threads'),
+    path('threads/trending/', views.trending_threads, name='trending_threads'),
     path('search/', views.search, name='search'),
     
     # Categories
@@ -14,6 +15,7 @@
     
     # Threads
     path('thread/<int:pk>/', views.thread_detail, name='thread_detail'),
+    path('thread/<int:pk>/replies/', views.thread_replies, name='thread_replies'),
     path('thread/create/', views.create_thread, name='create_thread'),
     path('thread/create/<slug:category_slug>/', views.create_thread, name='create_thread_in_category'),
     path('thread/<int:pk>/edit/', views.edit_thread, name='edit_thread'),
@@ -24,11 +26,15 @@
     
     # Replies
     path('thread/<int:thread_pk>/reply/', views.create_reply, name='create_reply'),
+    path('reply/<int:pk>/', views.reply_permalink, name='reply_permalink'),
     path('reply/<int:pk>/edit/', views.edit_reply, name='edit_reply'),
     path('reply/<int:pk>/delete/', views.delete_reply, name='delete_reply'),
     path('reply/<int:pk>/like/', views.toggle_reply_like, name='toggle_reply_like'),
     path('reply/<int:pk>/solution/', views.mark_reply_solution, name='mark_solution'),
     
+    # Notifications
+    path('notifications/settings/', views.notification_settings, name='notification_settings'),
+    
     # Reporting
     path('report/', views.report_content, name='report_content'),
     
@@ -37,5 +43,6 @@
     path('moderation/users/', views.manage_users, name='manage_users'),
     path('moderation/toggle/<int:pk>/', views.toggle_moderator, name='toggle_moderator'),
     path('moderation/toggle-admin/<int:pk>/', views.toggle_admin, name='toggle_admin'),
-    path('moderation/report/<int:pk>/', views.resolve_report, name='handle_report'),
+    path('moderation/reports/', views.handle_reports, name='handle_reports'),
+    path('moderation/performance/', views.performance_stats, name='performance_stats'),
 ]
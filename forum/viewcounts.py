@@ -0,0 +1,226 @@
+"""
+Buffered view counting.
+
+Page views are tallied in a process-local buffer instead of issuing an UPDATE
+(and taking a row lock) on every request. At most every
+FORUM_VIEW_FLUSH_INTERVAL seconds a worker spills its buffer into the shared
+``PendingViewCount`` rows (one per object, added to with ``F() + n``) and
+drains one batch of those into the objects' ``views`` columns with one
+``F('views') + n`` UPDATE per model and increment size. A drain subtracts
+what it wrote and deletes the rows left at zero in the same transaction, so
+counts are neither lost when the write fails nor written twice by
+concurrent drains. Failures in the request path are logged, never raised.
+``manage.py flush_view_counts`` drains everything on demand. At exit a
+process only spills its buffer.
+
+Repeat views of the same object by the same viewer (session, user or client
+address) within FORUM_VIEW_DEDUP_WINDOW seconds are not counted.
+"""
+import atexit
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import PendingViewCount
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'FORUM_VIEW_FLUSH_INTERVAL', 30)
+DEDUP_WINDOW = getattr(settings, 'FORUM_VIEW_DEDUP_WINDOW', 30 * 60)
+
+# Pending rows claimed by each drain transaction
+DRAIN_BATCH_SIZE = 1000
+
+SEEN_KEY_PREFIX = 'forum:views:seen:'
+
+
+def _viewer_id(request):
+    """Identify the viewer for de-duplication purposes"""
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        return f's:{session_key}'
+    if request.user.is_authenticated:
+        return f'u:{request.user.pk}'
+    client = '{}|{}'.format(
+        request.META.get('REMOTE_ADDR', ''),
+        request.META.get('HTTP_USER_AGENT', ''),
+    )
+    return 'a:' + hashlib.blake2b(client.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _by_increment(counts):
+    """Group ``{(label, pk): n}`` as ``{(label, n): [pk, ...]}``"""
+    groups = defaultdict(list)
+    for (label, pk), n in counts.items():
+        groups[(label, n)].append(pk)
+    return groups
+
+
+def _keys_filter(keys):
+    """Q matching the pending rows of ``(label, pk)`` keys"""
+    pks = defaultdict(list)
+    for label, pk in keys:
+        pks[label].append(pk)
+    query = Q()
+    for label, object_ids in pks.items():
+        query |= Q(model=label, object_id__in=object_ids)
+    return query
+
+
+def spill(counts):
+    """Add process-local ``{(label, pk): n}`` counts to the shared pending rows"""
+    if not counts:
+        return
+
+    with transaction.atomic():
+        # Lock every row before adding to it: a drain deletes the rows it
+        # empties, and must not do so between our insert and our update
+        locked = set()
+        while True:
+            missing = set(counts) - locked
+            locked |= set(
+                PendingViewCount.objects.select_for_update()
+                .filter(_keys_filter(missing)).order_by('pk')
+                .values_list('model', 'object_id')
+            )
+            missing -= locked
+            if not missing:
+                break
+            PendingViewCount.objects.bulk_create(
+                [PendingViewCount(model=label, object_id=pk) for label, pk in sorted(missing)],
+                ignore_conflicts=True
+            )
+        for (label, n), pks in _by_increment(counts).items():
+            PendingViewCount.objects.filter(model=label, object_id__in=pks).update(
+                views=F('views') + n
+            )
+
+
+def drain(batch_size=DRAIN_BATCH_SIZE, max_batches=None):
+    """
+    Write the shared pending rows to the database, ``batch_size`` rows per
+    transaction and at most ``max_batches`` transactions.
+    Returns the number of objects whose view count was updated.
+    """
+    updated = 0
+    last_pk = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batches += 1
+        with transaction.atomic():
+            # Rows a concurrent spill is adding to are left for the next drain
+            rows = list(
+                PendingViewCount.objects.select_for_update(skip_locked=True)
+                .filter(views__gt=0, pk__gt=last_pk).order_by('pk')[:batch_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+
+            claimed = {(row.model, row.object_id): row.views for row in rows}
+            for (label, n), pks in _by_increment(claimed).items():
+                try:
+                    model = apps.get_model(label)
+                except LookupError:
+                    pass
+                else:
+                    updates = {'views': F('views') + n}
+                    if hasattr(model, 'view_count_updates'):
+                        updates.update(model.view_count_updates(updates['views']))
+                    updated += model.objects.filter(pk__in=pks).update(**updates)
+                PendingViewCount.objects.filter(model=label, object_id__in=pks).update(
+                    views=F('views') - n
+                )
+            # Views added since the rows were read stay pending; the rest go
+            PendingViewCount.objects.filter(
+                pk__in=[row.pk for row in rows], views__lte=0
+            ).delete()
+    return updated
+
+
+class ViewCountBuffer:
+    """Thread-safe, process-local tally of views waiting to be flushed"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._last_flush = time.monotonic()
+
+    def add(self, obj):
+        """Count one view of ``obj``, flushing if the interval has elapsed"""
+        now = time.monotonic()
+        with self._lock:
+            self._counts[(obj._meta.label_lower, obj.pk)] += 1
+            due = now - self._last_flush >= self.flush_interval
+            if due:
+                self._last_flush = now
+        if due:
+            # Runs inside a page view: pay for one batch of the shared
+            # backlog at most, and never turn the page into an error
+            try:
+                self.spill()
+                drain(max_batches=1)
+            except Exception:
+                logger.exception('Failed to flush buffered view counts')
+
+    def spill(self):
+        """Move buffered views to the shared buffer"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._last_flush = time.monotonic()
+        try:
+            spill(counts)
+        except Exception:
+            # Keep them for the next attempt
+            with self._lock:
+                self._counts.update(counts)
+            raise
+
+    def flush(self):
+        """Move buffered views to the shared buffer and drain all of it"""
+        self.spill()
+        return drain()
+
+
+buffer = ViewCountBuffer()
+
+
+def increment(obj):
+    """Buffer one view of ``obj`` without de-duplication"""
+    buffer.add(obj)
+
+
+def record_view(request, obj):
+    """
+    Buffer a page view of ``obj`` unless this viewer already viewed it
+    within the de-duplication window. Returns True if the view was counted.
+    """
+    seen_key = f'{SEEN_KEY_PREFIX}{_viewer_id(request)}:{obj._meta.label_lower}:{obj.pk}'
+    if not cache.add(seen_key, 1, DEDUP_WINDOW):
+        return False
+    buffer.add(obj)
+    return True
+
+
+def flush():
+    """Flush this process's buffer and drain the shared buffer"""
+    return buffer.flush()
+
+
+@atexit.register
+def _spill_at_exit():
+    # Only hand the counts over to the pending rows; the next flush by any
+    # worker or flush_view_counts adds them to the objects.
+    try:
+        buffer.spill()
+    except Exception:
+        logger.exception('Failed to spill buffered view counts')
@@ -1,94 +1,140 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Count, Prefetch
-from django.http import JsonResponse, HttpResponseForbidden
+from django.db.models import Q, Count, Max, prefetch_related_objects
+from django.db.models.functions import Coalesce, Lower
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+)
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.urls import reverse
-from django_ratelimit.decorators import ratelimit
+from django.utils.http import urlencode
 from django.conf import settings
 from django.db import connection
 
 User = get_user_model()
 
-# Import PostgreSQL search if available
-try:
-    from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank, TrigramSimilarity
-    HAS_POSTGRES = True
-except ImportError:
-    HAS_POSTGRES = False
-
-# Import fuzzy search for SQLite
-try:
-    from fuzzywuzzy import fuzz, process
-    HAS_FUZZY = True
-except ImportError:
-    HAS_FUZZY = False
-
-from .models import Category, Thread, Reply, Tag, ThreadLike, ReplyLike, Report
-from .forms import ThreadForm, ReplyForm, ReportForm
+from .models import Category, Thread, Reply, Tag, ThreadLike, ReplyLike, Report, UserStats
+from .forms import ThreadForm, ReplyForm, ReportForm, NotificationSettingsForm
 from .permissions import (
     can_edit_content, can_delete_content, can_lock_thread,
     can_pin_thread, can_mark_solution, moderator_required
 )
-from .notifications import send_reply_notification, send_thread_locked_notification
+from .notifications import (
+    send_reply_notification, send_mention_notifications, send_thread_locked_notification
+)
+from .caching import (
+    ratelimit, conditional_page, home_page_cache, page_stamps, thread_row_cache,
+    thread_counts, user_counts, FRAGMENT_CACHES
+)
+from .pagination import KeysetPaginator, CachedCountPaginator, cached_count
+from . import performance
+from .search import sqlite_search, postgres_search
+from .viewcounts import record_view
 from courses.models import Course
 from resources.models import Resource
 
+REPLIES_PER_PAGE = 20
+THREADS_PER_PAGE = 20
+CATEGORY_THREADS_PER_PAGE = 10
+
+# Keyset orderings of the thread listings by sort option; each ends in id
+# so that ties break the same way on every page
+THREAD_LIST_ORDERINGS = {
+    'latest': ['-last_activity', '-id'],
+    'hot': ['-hot_score', '-id'],
+    'popular': ['-like_count', '-reply_count', '-id'],
+    'most_viewed': ['-views', '-id'],
+    'oldest': ['created_at', 'id'],
+    'unanswered': ['-created_at', '-id'],
+}
+CATEGORY_THREAD_ORDERINGS = {
+    'latest': ['-is_pinned', '-last_activity', '-id'],
+    'hot': ['-is_pinned', '-hot_score', '-id'],
+    'popular': ['-is_pinned', '-like_count', '-reply_count', '-id'],
+    'unanswered': ['-is_pinned', '-last_activity', '-id'],
+}
+TRENDING_WINDOW = timedelta(days=7)
+
+# manage_users role filters and sort options; each ordering is served by an
+# index on accounts.User
+USER_ROLES = {
+    'admin': Q(is_superuser=True),
+    'moderator': Q(is_moderator=True, is_superuser=False),
+    'regular': Q(is_moderator=False, is_staff=False, is_superuser=False),
+}
+USER_ORDERINGS = {
+    '-created_at': ['-created_at', '-id'],
+    'created_at': ['created_at', 'id'],
+    'full_name': [Lower('full_name'), 'id'],
+    '-last_login': ['-last_login', '-id'],
+}
+
+# Moderation queue entries (one per reported thread or reply) and the
+# report status each bulk action closes them with
+REPORT_ENTRIES_PER_PAGE = 20
+REPORT_ENTRY_ORDERINGS = {
+    'recent': ['-latest_id'],
+    'most_reported': ['-report_count', '-latest_id'],
+}
+REPORT_ACTIONS = {
+    'resolve': Report.ReportStatus.RESOLVED,
+    'dismiss': Report.ReportStatus.DISMISSED,
+    'delete_content': Report.ReportStatus.RESOLVED,
+}
+
 
 def forum_home(request):
     """Forum home page showing all categories"""
+    context = home_page_cache.get_or_set('data', _home_page_data)
+    if request.user.is_authenticated:
+        context = {**context, 'user_stats': UserStats.for_user(request.user)}
+    return render(request, 'forum/home.html', context)
+
+
+def _home_page_data():
+    """The parts of the home page that are the same for every visitor"""
     categories = Category.objects.annotate(
         thread_count=Count('threads', filter=Q(threads__is_deleted=False))
     ).order_by('order', 'name')
     
-    # Get recent threads
-    recent_threads = Thread.objects.filter(
-        is_deleted=False
-    ).select_related('author', 'category').order_by('-last_activity')[:5]
-    
-    # Get popular threads (most liked)
-    popular_threads = Thread.objects.filter(
-        is_deleted=False
-    ).annotate(
-        like_count=Count('likes')
-    ).select_related('author', 'category').order_by('-like_count')[:5]
-    
-    context = {
-        'categories': categories,
-        'recent_threads': recent_threads,
-        'popular_threads': popular_threads,
+    threads = Thread.objects.filter(is_deleted=False).select_related(
+        'author', 'category'
+    ).defer('content', 'content_html', 'search_vector')
+    
+    return {
+        'categories': list(categories),
+        # Get recent threads
+        'recent_threads': list(threads.order_by('-last_activity')[:5]),
+        # Hottest threads active this week
+        'trending_threads': list(
+            threads.filter(last_activity__gte=timezone.now() - TRENDING_WINDOW)
+            .order_by('-hot_score')[:5]
+        ),
     }
-    return render(request, 'forum/home.html', context)
 
 
+@conditional_page(page_stamps, lambda: ['threads', 'taxonomy', 'users'])
 def all_threads(request):
     """View all threads with sorting and filtering"""
     threads = Thread.objects.filter(is_deleted=False).select_related(
         'author', 'category'
-    ).prefetch_related(
-        'tags',
-        Prefetch('replies', queryset=Reply.objects.filter(is_deleted=False))
-    ).annotate(
-        reply_count=Count('replies', filter=Q(replies__is_deleted=False)),
-        like_count=Count('likes')
     )
     
     # Sorting
     sort = request.GET.get('sort', 'latest')
-    if sort == 'popular':
-        threads = threads.order_by('-like_count', '-reply_count')
-    elif sort == 'latest':
-        threads = threads.order_by('-last_activity')
-    elif sort == 'oldest':
-        threads = threads.order_by('created_at')
-    elif sort == 'most_viewed':
-        threads = threads.order_by('-views')
-    elif sort == 'unanswered':
-        threads = threads.filter(reply_count=0).order_by('-created_at')
+    if sort not in THREAD_LIST_ORDERINGS:
+        sort = 'latest'
+    if sort == 'unanswered':
+        threads = threads.filter(reply_count=0)
     
     # Category filter
     category_filter = request.GET.get('category')
@@ -108,10 +154,14 @@ def all_threads(request):
             Q(content__icontains=search_query)
         )
     
-    # Pagination
-    paginator = Paginator(threads, 20)
-    page = request.GET.get('page')
-    threads = paginator.get_page(page)
+    # Keyset pagination
+    filtered = threads
+    threads = _listing_page(
+        request, threads, THREAD_LIST_ORDERINGS[sort], THREADS_PER_PAGE,
+        'forum/partials/thread_row.html'
+    )
+    if request.GET.get('format') == 'json':
+        return _listing_fragment(request, threads, 'forum/partials/thread_list.html')
     
     # Get all categories and tags for filtering
     categories = Category.objects.all().order_by('name')
@@ -119,6 +169,9 @@ def all_threads(request):
     
     context = {
         'threads': threads,
+        'thread_count': cached_count(filtered.select_related(None), thread_counts),
+        'is_first_page': not request.GET.get('after'),
+        'filter_query': _filter_query(request, 'sort', 'category', 'tag', 'q'),
         'categories': categories,
         'tags': tags,
         'current_sort': sort,
@@ -129,6 +182,29 @@ def all_threads(request):
     return render(request, 'forum/all_threads.html', context)
 
 
+def trending_threads(request):
+    """Threads active this week, hottest first (see forum.ranking)"""
+    threads = Thread.objects.filter(
+        is_deleted=False,
+        last_activity__gte=timezone.now() - TRENDING_WINDOW
+    ).select_related('author', 'category')
+    
+    threads = _listing_page(
+        request, threads, THREAD_LIST_ORDERINGS['hot'], THREADS_PER_PAGE,
+        'forum/partials/thread_row.html'
+    )
+    if request.GET.get('format') == 'json':
+        return _listing_fragment(request, threads, 'forum/partials/thread_list.html')
+    
+    context = {
+        'threads': threads,
+        'is_first_page': not request.GET.get('after'),
+        'filter_query': '',
+    }
+    return render(request, 'forum/trending_threads.html', context)
+
+
+@conditional_page(page_stamps, lambda slug: [f'category:{slug}', 'taxonomy', 'users'])
 def category_detail(request, slug):
     """Display threads in a category"""
     category = get_object_or_404(Category, slug=slug)
@@ -136,13 +212,7 @@ def category_detail(request, slug):
     threads = Thread.objects.filter(
         category=category,
         is_deleted=False
-    ).select_related('author').prefetch_related(
-        'tags',
-        Prefetch('replies', queryset=Reply.objects.filter(is_deleted=False))
-    ).annotate(
-        reply_count=Count('replies', filter=Q(replies__is_deleted=False)),
-        like_count=Count('likes')
-    ).order_by('-is_pinned', '-last_activity')
+    ).select_related('author', 'last_reply_author')
     
     # Filtering
     tag_filter = request.GET.get('tag')
@@ -158,15 +228,19 @@ def category_detail(request, slug):
     
     # Sorting
     sort = request.GET.get('sort', 'latest')
-    if sort == 'popular':
-        threads = threads.order_by('-is_pinned', '-like_count', '-reply_count')
-    elif sort == 'unanswered':
+    if sort not in CATEGORY_THREAD_ORDERINGS:
+        sort = 'latest'
+    if sort == 'unanswered':
         threads = threads.filter(reply_count=0)
     
-    # Pagination
-    paginator = Paginator(threads, 10)
-    page = request.GET.get('page')
-    threads = paginator.get_page(page)
+    # Keyset pagination
+    filtered = threads
+    threads = _listing_page(
+        request, threads, CATEGORY_THREAD_ORDERINGS[sort], CATEGORY_THREADS_PER_PAGE,
+        'forum/partials/category_thread_row.html'
+    )
+    if request.GET.get('format') == 'json':
+        return _listing_fragment(request, threads, 'forum/partials/category_thread_list.html')
     
     # Get all tags for filtering
     tags = Tag.objects.all()
@@ -174,6 +248,9 @@ def category_detail(request, slug):
     context = {
         'category': category,
         'threads': threads,
+        'thread_count': cached_count(filtered.select_related(None), thread_counts),
+        'is_first_page': not request.GET.get('after'),
+        'filter_query': _filter_query(request, 'sort', 'tag', 'q'),
         'tags': tags,
         'current_tag': tag_filter,
         'search_query': search_query,
@@ -182,6 +259,64 @@ def category_detail(request, slug):
     return render(request, 'forum/category_detail.html', context)
 
 
+def _listing_page(request, threads, ordering, per_page, row_template):
+    """
+    The keyset page of ``threads`` after the ``after`` cursor (the first page
+    if it is missing or invalid), with listing rows attached
+    """
+    paginator = KeysetPaginator(threads, ordering, per_page)
+    try:
+        page = paginator.page(request.GET.get('after'))
+    except ValueError:
+        page = paginator.page()
+    _attach_row_html(page, row_template)
+    return page
+
+
+def _listing_fragment(request, page, template_name):
+    """JSON with the rendered rows of ``page`` and the next cursor, for infinite scroll"""
+    return JsonResponse({
+        'html': render_to_string(template_name, {'threads': page}, request=request),
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
+
+def _filter_query(request, *params):
+    """Query string repeating the given GET parameters that are set"""
+    return urlencode({param: request.GET[param] for param in params if request.GET.get(param)})
+
+
+def _attach_row_html(threads, template_name):
+    """
+    Set ``thread.row_html`` to the thread's rendered listing row, taken from
+    the fragment cache where possible. Tags are only fetched for misses.
+    """
+    threads = list(threads)
+
+    def render_rows(misses):
+        prefetch_related_objects(misses, 'tags')
+        return [render_to_string(template_name, {'thread': thread}) for thread in misses]
+
+    rows = thread_row_cache.render_many(
+        threads,
+        lambda thread: f'{template_name}:{thread.pk}:{thread.version}',
+        render_rows
+    )
+    for thread, row in zip(threads, rows):
+        thread.row_html = mark_safe(row)
+
+
+def _record_revalidated_view(request, pk):
+    # A 304 is still a view, even though the thread was never loaded
+    record_view(request, Thread(pk=pk))
+
+
+@conditional_page(
+    page_stamps,
+    lambda pk: [f'thread:{pk}', 'taxonomy', 'users'],
+    not_modified=_record_revalidated_view
+)
 def thread_detail(request, pk):
     """Display a thread and its replies"""
     thread = get_object_or_404(
@@ -196,15 +331,22 @@ def thread_detail(request, pk):
         messages.error(request, "This thread has been deleted.")
         return redirect('forum:home')
     
-    # Increment view count
-    thread.views += 1
-    thread.save(update_fields=['views'])
+    # Count the view (buffered and de-duplicated per viewer)
+    record_view(request, thread)
     
-    # Get replies
-    replies = Reply.objects.filter(
-        thread=thread,
-        is_deleted=False
-    ).select_related('author').order_by('created_at')
+    # Get replies: the accepted solution is pinned above a keyset-paginated
+    # stream of the remaining replies
+    cursor = request.GET.get('after')
+    solution = Reply.objects.filter(
+        thread=thread, is_deleted=False, is_solution=True
+    ).select_related('author').first()
+    
+    paginator = _reply_paginator(thread)
+    try:
+        replies = paginator.page(cursor)
+    except ValueError:
+        cursor = None
+        replies = paginator.page()
     
     # Check permissions
     can_edit = can_edit_content(request.user, thread)
@@ -212,14 +354,17 @@ def thread_detail(request, pk):
     can_lock = can_lock_thread(request.user)
     can_pin = can_pin_thread(request.user)
     
-    # Check if user has liked the thread
+    # Check if user has liked the thread and which of the shown replies
     user_liked = False
     if request.user.is_authenticated:
         user_liked = ThreadLike.objects.filter(user=request.user, thread=thread).exists()
+    _annotate_reply_likes([solution, *replies] if solution else replies, request.user)
     
     context = {
         'thread': thread,
+        'solution': solution,
         'replies': replies,
+        'is_first_page': not cursor,
         'can_edit': can_edit,
         'can_delete': can_delete,
         'can_lock': can_lock,
@@ -229,6 +374,75 @@ def thread_detail(request, pk):
     return render(request, 'forum/thread_detail.html', context)
 
 
+def thread_replies(request, pk):
+    """Return the next page of a thread's replies for "load more" (HTML fragment or JSON)"""
+    thread = get_object_or_404(Thread, pk=pk)
+    
+    if thread.is_deleted and not request.user.is_staff:
+        raise Http404("Thread not found")
+    
+    try:
+        replies = _reply_paginator(thread).page(request.GET.get('after'))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
+    _annotate_reply_likes(replies, request.user)
+    
+    html = render_to_string('forum/partials/reply_list.html', {
+        'thread': thread,
+        'replies': replies,
+    }, request=request)
+    
+    if (request.GET.get('format') == 'json'
+            or request.headers.get('X-Requested-With') == 'XMLHttpRequest'):
+        return JsonResponse({
+            'html': html,
+            'next_cursor': replies.next_cursor,
+            'has_next': replies.has_next,
+        })
+    
+    response = HttpResponse(html)
+    if replies.has_next:
+        response['X-Next-Cursor'] = replies.next_cursor
+    return response
+
+
+def reply_permalink(request, pk):
+    """Redirect to the page of the thread that contains a reply"""
+    reply = get_object_or_404(Reply.objects.select_related('thread'), pk=pk, is_deleted=False)
+    url = reverse('forum:thread_detail', kwargs={'pk': reply.thread.pk})
+    
+    # The solution is pinned on the first page
+    if not reply.is_solution:
+        cursor = _reply_paginator(reply.thread).cursor_for_page_containing(reply)
+        if cursor:
+            url = f"{url}?{urlencode({'after': cursor})}"
+    
+    return redirect(f"{url}#reply-{reply.pk}")
+
+
+def _annotate_reply_likes(replies, user):
+    """Set ``user_liked`` on each reply using a single query for the whole page"""
+    liked_ids = set()
+    if user.is_authenticated and replies:
+        liked_ids = set(ReplyLike.objects.filter(
+            user=user,
+            reply_id__in=[reply.pk for reply in replies]
+        ).values_list('reply_id', flat=True))
+    
+    for reply in replies:
+        reply.user_liked = reply.pk in liked_ids
+
+
+def _reply_paginator(thread):
+    """Keyset paginator over a thread's visible replies, excluding the pinned solution"""
+    replies = Reply.objects.filter(
+        thread=thread,
+        is_deleted=False,
+        is_solution=False
+    ).select_related('author')
+    return KeysetPaginator(replies, ['created_at', 'id'], REPLIES_PER_PAGE)
+
+
 @login_required
 @ratelimit(key='user', rate='5/h', method='POST')
 def create_thread(request, category_slug=None):
@@ -246,6 +460,7 @@ def create_thread(request, category_slug=None):
                 thread.category = category
             thread.save()
             form.save_m2m()  # Save many-to-many relationships
+            send_mention_notifications(thread, request.user, thread.content)
             
             messages.success(request, "Thread created successfully!")
             return redirect('forum:thread_detail', pk=thread.pk)
@@ -270,12 +485,16 @@ def edit_thread(request, pk):
         return redirect('forum:thread_detail', pk=pk)
     
     if request.method == 'POST':
+        previous_content = thread.content
         form = ThreadForm(request.POST, instance=thread)
         if form.is_valid():
             thread = form.save(commit=False)
             thread.edited_at = timezone.now()
             thread.save()
             form.save_m2m()
+            send_mention_notifications(
+                thread, request.user, thread.content, previous_content=previous_content
+            )
             
             messages.success(request, "Thread updated successfully!")
             return redirect('forum:thread_detail', pk=pk)
@@ -299,8 +518,7 @@ def delete_thread(request, pk):
         messages.error(request, "You don't have permission to delete this thread.")
         return redirect('forum:thread_detail', pk=pk)
     
-    thread.is_deleted = True
-    thread.save()
+    thread.soft_delete()
     
     messages.success(request, "Thread deleted successfully!")
     return redirect('forum:category_detail', slug=thread.category.slug)
@@ -324,10 +542,12 @@ def create_reply(request, thread_pk):
         reply.thread = thread
         reply.save()
         
-        # Send email notification to thread author
+        # Queue email notifications for the thread author and mentioned users
         send_reply_notification(reply)
+        send_mention_notifications(thread, request.user, reply.content, reply=reply)
         
         messages.success(request, "Reply posted successfully!")
+        return redirect('forum:reply_permalink', pk=reply.pk)
     else:
         messages.error(request, "Error posting reply. Please check your input.")
     
@@ -344,11 +564,16 @@ def edit_reply(request, pk):
         return redirect('forum:thread_detail', pk=reply.thread.pk)
     
     if request.method == 'POST':
+        previous_content = reply.content
         form = ReplyForm(request.POST, instance=reply)
         if form.is_valid():
             reply = form.save(commit=False)
             reply.edited_at = timezone.now()
             reply.save()
+            send_mention_notifications(
+                reply.thread, request.user, reply.content,
+                reply=reply, previous_content=previous_content
+            )
             
             messages.success(request, "Reply updated successfully!")
             return redirect('forum:thread_detail', pk=reply.thread.pk)
@@ -373,8 +598,7 @@ def delete_reply(request, pk):
         messages.error(request, "You don't have permission to delete this reply.")
         return redirect('forum:thread_detail', pk=thread_pk)
     
-    reply.is_deleted = True
-    reply.save()
+    reply.soft_delete()
     
     messages.success(request, "Reply deleted successfully!")
     return redirect('forum:thread_detail', pk=thread_pk)
@@ -398,9 +622,10 @@ def toggle_thread_like(request, pk):
         liked = True
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        thread.refresh_from_db(fields=['like_count'])
         return JsonResponse({
             'liked': liked,
-            'like_count': thread.likes.count()
+            'like_count': thread.like_count
         })
     
     return redirect('forum:thread_detail', pk=pk)
@@ -424,9 +649,10 @@ def toggle_reply_like(request, pk):
         liked = True
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        reply.refresh_from_db(fields=['like_count'])
         return JsonResponse({
             'liked': liked,
-            'like_count': reply.likes.count()
+            'like_count': reply.like_count
         })
     
     return redirect('forum:thread_detail', pk=reply.thread.pk)
@@ -478,12 +704,8 @@ def mark_reply_solution(request, pk):
     if not can_mark_solution(request.user, thread):
         return HttpResponseForbidden("Only the thread author can mark solutions.")
     
-    # Unmark previous solution if exists
-    Reply.objects.filter(thread=thread, is_solution=True).update(is_solution=False)
-    
-    # Mark this reply as solution
-    reply.is_solution = True
-    reply.save()
+    # Replaces any previous solution
+    reply.mark_as_solution()
     
     messages.success(request, "Reply marked as solution!")
     return redirect('forum:thread_detail', pk=thread.pk)
@@ -497,7 +719,7 @@ def report_content(request):
         form = ReportForm(request.POST)
         if form.is_valid():
             report = form.save(commit=False)
-            report.reported_by = request.user
+            report.reporter = request.user
             
             # Determine content type
             content_type = request.POST.get('content_type')
@@ -524,86 +746,70 @@ def report_content(request):
 @moderator_required
 def manage_users(request):
     """Manage users and moderators (admins only)"""
-    from django.db.models import Count, Q
-    from django.utils import timezone
-    from datetime import timedelta
-    
     # Get filter parameters
-    search_query = request.GET.get('search', '')
+    search_query = request.GET.get('search', '').strip()
     role_filter = request.GET.get('role', '')
     sort_by = request.GET.get('sort', '-created_at')
+    if sort_by not in USER_ORDERINGS:
+        sort_by = '-created_at'
     
-    # Base queryset with annotations
-    users = User.objects.annotate(
-        thread_count=Count('threads', distinct=True),
-        reply_count=Count('replies', distinct=True)
-    )
+    users = User.objects.all()
     
     # Apply search filter
     if search_query:
-        users = users.filter(
-            Q(full_name__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(username__icontains=search_query)
-        )
+        users = _search_users(users, search_query)
     
     # Apply role filter
-    if role_filter == 'admin':
-        users = users.filter(is_superuser=True)
-    elif role_filter == 'moderator':
-        users = users.filter(
-            is_moderator=True, is_superuser=False
-        )
-    elif role_filter == 'regular':
-        users = users.filter(
-            is_moderator=False, is_staff=False, is_superuser=False
-        )
+    if role_filter in USER_ROLES:
+        users = users.filter(USER_ROLES[role_filter])
     
-    # Apply sorting
-    if sort_by:
-        users = users.order_by(sort_by)
-    
-    # Calculate statistics
-    total_users = User.objects.count()
-    total_admins = User.objects.filter(is_superuser=True).count()
-    total_moderators = User.objects.filter(
-        is_moderator=True, is_superuser=False
-    ).count()
-    total_regular = User.objects.filter(
-        is_moderator=False, is_staff=False, is_superuser=False
-    ).count()
-    active_today = User.objects.filter(
-        last_login__gte=timezone.now() - timedelta(days=1)
-    ).count()
-    new_this_week = User.objects.filter(
-        created_at__gte=timezone.now() - timedelta(days=7)
-    ).count()
+    # Annotations, after filtering so that counting can leave them out
+    filtered = users
+    users = users.annotate(
+        thread_count=Coalesce('forum_stats__thread_count', 0),
+        reply_count=Coalesce('forum_stats__reply_count', 0)
+    ).order_by(*USER_ORDERINGS[sort_by])
     
     # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(users, 20)  # 20 users per page
-    page = request.GET.get('page', 1)
-    
-    try:
-        users_page = paginator.page(page)
-    except:
-        users_page = paginator.page(1)
+    paginator = CachedCountPaginator(users, 20, filtered, user_counts)  # 20 users per page
+    users_page = paginator.get_page(request.GET.get('page'))
     
     context = {
         'users': users_page,
         'page_obj': users_page,
         'is_paginated': paginator.num_pages > 1,
-        'total_users': total_users,
-        'total_admins': total_admins,
-        'total_moderators': total_moderators,
-        'total_regular': total_regular,
-        'active_today': active_today,
-        'new_this_week': new_this_week,
+        **user_counts.get_or_set('header-stats', _user_header_stats),
     }
     
     return render(request, 'forum/manage_users.html', context)
 
 
+def _user_header_stats():
+    """The figures at the top of manage_users, in one conditional aggregate"""
+    now = timezone.now()
+    return User.objects.aggregate(
+        total_users=Count('pk'),
+        total_admins=Count('pk', filter=USER_ROLES['admin']),
+        total_moderators=Count('pk', filter=USER_ROLES['moderator']),
+        total_regular=Count('pk', filter=USER_ROLES['regular']),
+        active_today=Count('pk', filter=Q(last_login__gte=now - timedelta(days=1))),
+        new_this_week=Count('pk', filter=Q(created_at__gte=now - timedelta(days=7))),
+    )
+
+
+def _search_users(users, query):
+    """
+    Users whose name, username or email contains ``query``. On PostgreSQL
+    trigram indexes serve the match (accounts migration 0003); elsewhere it
+    is a scan, which stays cheap at the sizes SQLite is used for.
+    """
+    return users.filter(
+        Q(full_name__icontains=query) |
+        Q(email__icontains=query) |
+        Q(username__icontains=query)
+    )
+
+
 @login_required
 @moderator_required
 def toggle_moderator(request, pk):
@@ -668,39 +874,157 @@ def toggle_admin(request, pk):
 @login_required
 @moderator_required
 def moderation_queue(request):
-    """View pending reports (moderators only)"""
-    reports = Report.objects.filter(
-        status='pending'
-    ).select_related(
-        'thread', 'reply', 'reporter'
-    ).order_by('-created_at')
+    """Reported content, one entry per thread or reply (moderators only)"""
+    status = request.GET.get('status', Report.ReportStatus.PENDING)
+    if status not in Report.ReportStatus.values:
+        status = Report.ReportStatus.PENDING
+    sort = request.GET.get('sort', 'recent')
+    if sort not in REPORT_ENTRY_ORDERINGS:
+        sort = 'recent'
+    
+    entries = Report.objects.filter(status=status).values('thread_id', 'reply_id').annotate(
+        report_count=Count('pk'),
+        latest_id=Max('pk'),
+    ).order_by(*REPORT_ENTRY_ORDERINGS[sort])
+    
+    paginator = Paginator(entries, REPORT_ENTRIES_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    page.object_list = _report_entries(page.object_list, status)
     
     context = {
-        'reports': reports,
+        'entries': page,
+        'page_obj': page,
+        'is_paginated': paginator.num_pages > 1,
+        'status_counts': _report_status_counts(),
+        'current_status': status,
+        'is_open': status in Report.OPEN_STATUSES,
+        'current_sort': sort,
     }
     return render(request, 'forum/moderation_queue.html', context)
 
 
+def _report_entries(entries, status):
+    """
+    Attach to each queue entry its thread or reply, its latest report and a
+    breakdown of its reports by reason, with one query per kind of row.
+    """
+    entries = list(entries)
+    thread_ids = [entry['thread_id'] for entry in entries if entry['thread_id']]
+    reply_ids = [entry['reply_id'] for entry in entries if entry['reply_id']]
+    threads = Thread.objects.select_related('author').in_bulk(thread_ids)
+    replies = Reply.objects.select_related('author', 'thread').in_bulk(reply_ids)
+    latest = Report.objects.select_related('reporter').in_bulk(
+        [entry['latest_id'] for entry in entries]
+    )
+    
+    reasons = defaultdict(list)
+    if entries:
+        labels = dict(Report.ReportReason.choices)
+        rows = Report.objects.filter(
+            Q(thread_id__in=thread_ids) | Q(reply_id__in=reply_ids), status=status
+        ).values('thread_id', 'reply_id', 'reason').annotate(
+            count=Count('pk')
+        ).order_by('-count', 'reason')
+        for row in rows:
+            reasons[row['thread_id'], row['reply_id']].append(
+                (labels.get(row['reason'], row['reason']), row['count'])
+            )
+    
+    for entry in entries:
+        entry['thread'] = threads.get(entry['thread_id'])
+        entry['reply'] = replies.get(entry['reply_id'])
+        entry['latest'] = latest.get(entry['latest_id'])
+        entry['reasons'] = reasons[entry['thread_id'], entry['reply_id']]
+        entry['target'] = (
+            f"thread:{entry['thread_id']}" if entry['thread_id'] else f"reply:{entry['reply_id']}"
+        )
+    return entries
+
+
+def _report_status_counts():
+    """Number of reports in each status, in one conditional aggregate"""
+    counts = Report.objects.aggregate(**{
+        status.lower(): Count('pk', filter=Q(status=status))
+        for status in Report.ReportStatus.values
+    })
+    return [
+        {'status': status, 'label': label, 'count': counts[status.lower()]}
+        for status, label in Report.ReportStatus.choices
+    ]
+
+
 @login_required
 @moderator_required
-@require_POST
-def resolve_report(request, pk):
-    """Resolve a report (moderators only)"""
-    report = get_object_or_404(Report, pk=pk)
+def performance_stats(request):
+    """Per-view latency, query and render statistics (moderators only)"""
+    sort = request.GET.get('sort', 'total')
+    if sort not in performance.SORT_KEYS:
+        sort = 'total'
     
-    action = request.POST.get('action')
-    notes = request.POST.get('notes', '')
-    
-    if action == 'resolve':
-        report.resolve(request.user, notes)
-        messages.success(request, "Report resolved successfully!")
-    elif action == 'dismiss':
-        report.dismiss(request.user, notes)
-        messages.success(request, "Report dismissed.")
+    # Include this worker's latest requests
+    performance.stats.publish()
     
+    context = {
+        'rows': performance.summarize(performance.stats.collect(), sort),
+        'sort_options': list(performance.SORT_KEYS),
+        'current_sort': sort,
+        'fragment_caches': [
+            {'name': fragment_cache.name, **fragment_cache.stats()}
+            for fragment_cache in FRAGMENT_CACHES
+        ],
+    }
+    return render(request, 'forum/performance_stats.html', context)
+
+
+@login_required
+@moderator_required
+@require_POST
+def handle_reports(request):
+    """Close every open report on the selected queue entries at once (moderators only)"""
+    action = request.POST.get('action')
+    thread_ids, reply_ids = set(), set()
+    for target in request.POST.getlist('targets'):
+        kind, _, pk = target.partition(':')
+        if not pk.isdigit():
+            continue
+        if kind == 'thread':
+            thread_ids.add(int(pk))
+        elif kind == 'reply':
+            reply_ids.add(int(pk))
+    
+    if action not in REPORT_ACTIONS or not (thread_ids or reply_ids):
+        messages.error(request, "Select at least one report and an action.")
+        return redirect('forum:moderation_queue')
+    
+    if action == 'delete_content':
+        for thread in Thread.objects.filter(pk__in=thread_ids):
+            thread.soft_delete()
+        for reply in Reply.objects.select_related('thread').filter(pk__in=reply_ids):
+            reply.soft_delete()
+    
+    closed = Report.close(
+        Report.objects.filter(Q(thread_id__in=thread_ids) | Q(reply_id__in=reply_ids)),
+        REPORT_ACTIONS[action],
+        request.user,
+        request.POST.get('notes', '')
+    )
+    verb = 'dismissed' if action == 'dismiss' else 'resolved'
+    messages.success(request, f"{closed} report{'s' if closed != 1 else ''} {verb}.")
     return redirect('forum:moderation_queue')
 
 
+@login_required
+def notification_settings(request):
+    """Let a user choose immediate emails or an hourly/daily digest"""
+    form = NotificationSettingsForm(request.POST or None, instance=request.user)
+    if request.method == 'POST' and form.is_valid():
+        form.save()
+        messages.success(request, "Notification settings updated.")
+        return redirect('forum:notification_settings')
+    
+    return render(request, 'forum/notification_settings.html', {'form': form})
+
+
 def search(request):
     """Search threads and replies with fuzzy matching for both PostgreSQL and SQLite"""
     query = request.GET.get('q', '')
@@ -711,30 +1035,17 @@ def search(request):
         # Detect database type
         db_vendor = connection.vendor
         
-        if db_vendor == 'postgresql' and HAS_POSTGRES:
-            # Use PostgreSQL full-text search and trigram similarity
+        if db_vendor == 'postgresql':
+            # Stored search vectors and trigram indexes
             try:
-                # Search threads with fuzzy matching
-                threads = Thread.objects.filter(is_deleted=False).annotate(
-                    similarity=TrigramSimilarity('title', query) + TrigramSimilarity('content', query),
-                    search=SearchVector('title', weight='A') + SearchVector('content', weight='B'),
-                ).filter(
-                    Q(similarity__gt=0.1) | Q(search=SearchQuery(query))
-                ).order_by('-similarity').select_related('author', 'category')[:20]
-                
-                # Search replies with fuzzy matching
-                replies = Reply.objects.filter(is_deleted=False).annotate(
-                    similarity=TrigramSimilarity('content', query),
-                ).filter(
-                    similarity__gt=0.1
-                ).order_by('-similarity').select_related('author', 'thread')[:20]
+                threads, replies = postgres_search(query)
             except Exception as e:
                 # Fallback if PostgreSQL extensions not installed
                 threads, replies = _simple_search(query)
                 
-        elif db_vendor == 'sqlite' and HAS_FUZZY:
-            # Use fuzzy search for SQLite
-            threads, replies = _fuzzy_search_sqlite(query)
+        elif db_vendor == 'sqlite':
+            # FTS5 index with a trigram fallback for typos
+            threads, replies = sqlite_search(query)
             
         else:
             # Fallback to simple search
@@ -750,52 +1061,6 @@ def search(request):
     return render(request, 'forum/search.html', context)
 
 
-def _fuzzy_search_sqlite(query, threshold=60):
-    """
-    Fuzzy search implementation for SQLite using fuzzywuzzy
-    threshold: minimum similarity score (0-100)
-    """
-    from fuzzywuzzy import fuzz
-    
-    # Get all threads and calculate similarity scores
-    all_threads = Thread.objects.filter(is_deleted=False).select_related('author', 'category')
-    thread_results = []
-    
-    for thread in all_threads:
-        # Calculate similarity for title and content
-        title_score = fuzz.partial_ratio(query.lower(), thread.title.lower())
-        content_score = fuzz.partial_ratio(query.lower(), thread.content.lower())
-        
-        # Use the higher score, with title weighted slightly more
-        max_score = max(title_score * 1.2, content_score)
-        
-        if max_score >= threshold:
-            thread.similarity_score = max_score
-            thread_results.append((max_score, thread))
-    
-    # Sort by similarity score and get top 20
-    thread_results.sort(key=lambda x: x[0], reverse=True)
-    threads = [thread for score, thread in thread_results[:20]]
-    
-    # Get all replies and calculate similarity scores
-    all_replies = Reply.objects.filter(is_deleted=False).select_related('author', 'thread')
-    reply_results = []
-    
-    for reply in all_replies:
-        # Calculate similarity for content
-        score = fuzz.partial_ratio(query.lower(), reply.content.lower())
-        
-        if score >= threshold:
-            reply.similarity_score = score
-            reply_results.append((score, reply))
-    
-    # Sort by similarity score and get top 20
-    reply_results.sort(key=lambda x: x[0], reverse=True)
-    replies = [reply for score, reply in reply_results[:20]]
-    
-    return threads, replies
-
-
 def _simple_search(query):
     """
     Simple fallback search using icontains
@@ -817,9 +1082,9 @@ def _get_search_method(db_vendor):
     """
     Return a description of the search method being used
     """
-    if db_vendor == 'postgresql' and HAS_POSTGRES:
+    if db_vendor == 'postgresql':
         return "PostgreSQL Full-Text Search with Trigram Similarity"
-    elif db_vendor == 'sqlite' and HAS_FUZZY:
-        return "SQLite Fuzzy Search with Levenshtein Distance"
+    elif db_vendor == 'sqlite':
+        return "SQLite FTS5 Full-Text Search (BM25) with Trigram Fallback"
     else:
         return "Simple Substring Search"
\ No newline at end of file
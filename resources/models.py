@@ -59,9 +59,9 @@ def __str__(self):
         return f"{self.title} ({self.get_type_display()}) - {self.course.code}"
     
     def increment_views(self):
-        """Increment view count"""
-        self.views += 1
-        self.save(update_fields=['views'])
+        """Increment view count (buffered, see forum.viewcounts)"""
+        from forum.viewcounts import increment
+        increment(self)
     
     def get_icon(self):
         """Return appropriate icon class for resource type"""
@@ -61,6 +61,7 @@
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "forum.performance.PerformanceMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -113,6 +114,39 @@
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Shared by every worker (rate limits, de-duplication of views, page caches).
+# Production needs Redis (REDIS_URL): only its increments are atomic, so
+# only there do rate limits hold exactly across workers. Without it, a
+# database table created by `python manage.py createcachetable` is used, for
+# local development and tests; its increments are a read and a write, so
+# concurrent requests can slip past a rate limit. View counts are kept in
+# their own rows and are exact with either (see forum.viewcounts).
+
+if config('REDIS_URL', default=''):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": config('REDIS_URL'),
+            "KEY_PREFIX": "studydeck",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+            "KEY_PREFIX": "studydeck",
+            "OPTIONS": {
+                # The default of 300 is soon exceeded by per-viewer keys, and
+                # culling then evicts keys in sort order, not by age
+                "MAX_ENTRIES": config('CACHE_MAX_ENTRIES', default=1_000_000, cast=int),
+            },
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -222,6 +256,33 @@
     'markdown.extensions.fenced_code',
 ]
 
+# Number of rendered markdown documents kept in each process's LRU cache
+FORUM_MARKDOWN_CACHE_SIZE = config('FORUM_MARKDOWN_CACHE_SIZE', default=1024, cast=int)
+
+# Buffered view counts: seconds between flushes to the database, and how long
+# repeat views of the same thread by the same viewer are ignored
+FORUM_VIEW_FLUSH_INTERVAL = config('FORUM_VIEW_FLUSH_INTERVAL', default=30, cast=int)
+FORUM_VIEW_DEDUP_WINDOW = config('FORUM_VIEW_DEDUP_WINDOW', default=30 * 60, cast=int)
+
+# Queued email notifications are given up on after this many failed attempts
+FORUM_NOTIFICATION_MAX_ATTEMPTS = config('FORUM_NOTIFICATION_MAX_ATTEMPTS', default=5, cast=int)
+# Local hour (TIME_ZONE) at which daily notification digests are sent
+FORUM_DIGEST_HOUR = config('FORUM_DIGEST_HOUR', default=8, cast=int)
+
+# Most users one thread or reply can notify with @mentions
+FORUM_MAX_MENTIONS = config('FORUM_MAX_MENTIONS', default=10, cast=int)
+
+# Seconds between each worker publishing its per-view performance statistics
+FORUM_PERF_PUBLISH_INTERVAL = config('FORUM_PERF_PUBLISH_INTERVAL', default=30, cast=int)
+
+# Seconds listing row counts are cached for, and the PostgreSQL planner
+# estimate above which it is shown as "about N" instead of counting
+FORUM_COUNT_CACHE_TIMEOUT = config('FORUM_COUNT_CACHE_TIMEOUT', default=60, cast=int)
+FORUM_COUNT_ESTIMATE_THRESHOLD = config('FORUM_COUNT_ESTIMATE_THRESHOLD', default=50_000, cast=int)
+
+# Seconds for a thread's hot score weight to halve with age (see forum.ranking)
+FORUM_HOT_HALF_LIFE = config('FORUM_HOT_HALF_LIFE', default=24 * 60 * 60, cast=int)
+
 # Debug Toolbar
 INTERNAL_IPS = ["127.0.0.1"]
 